@@ -1,5 +1,9 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import threading
+import time
 import jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
@@ -8,20 +12,60 @@ from sqlalchemy.orm import Session
 
 from config import get_settings
 from models import User, get_db
+from cache import TTLCache
+import metrics
 
 settings = get_settings()
 security = HTTPBearer()
 
-def hash_password(password: str) -> str:
+# bcrypt 每次约 250ms CPU (计算时释放 GIL)，放到独立的小线程池执行，
+# 执行 + 排队的任务数有上限，登录洪峰时直接返回 429，不会占满处理其它请求的线程
+_password_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_password_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE
+)
+
+def _run_password_task(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        metrics.inc("password_hash_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过多，请稍后重试",
+            headers={"Retry-After": "1"}
+        )
+    start = time.perf_counter()
+    try:
+        return _password_pool.submit(fn, *args).result()
+    finally:
+        _password_slots.release()
+        metrics.observe("password_hash_seconds", time.perf_counter() - start)
+
+def _hashpw(password: str) -> str:
     password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt(rounds=12)
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode('utf-8')[:72]
     hashed_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
+def hash_password(password: str) -> str:
+    return _run_password_task(_hashpw, password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run_password_task(_checkpw, plain_password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """哈希的 cost ($2b$<rounds>$...) 与当前配置不同时，登录成功后需重新哈希"""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 def create_token(user_id: int, email: str, is_admin: bool = False) -> str:
     expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
     payload = {
@@ -41,10 +85,25 @@ def decode_token(token: str) -> Optional[dict]:
     except jwt.InvalidTokenError:
         return None
 
-async def get_current_user(
+@dataclass(frozen=True)
+class CurrentUser:
+    """已认证用户的身份信息 (不绑定数据库会话)，可跨请求缓存"""
+    id: int
+    email: str
+    is_admin: bool
+    status: str
+
+# 用户 ID → CurrentUser，避免每个请求都查询 users 表
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+def invalidate_user(user_id: int):
+    """用户状态/权限被修改或删除后调用，下次请求重新读取"""
+    _user_cache.delete(user_id)
+
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
+) -> CurrentUser:
     token = credentials.credentials
     payload = decode_token(token)
     
@@ -55,13 +114,28 @@ async def get_current_user(
         )
     
     user_id = int(payload.get("sub"))
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在"
+    user = _user_cache.get(user_id)
+    if user is None:
+        row = db.query(
+            User.id, User.email, User.is_admin, User.status
+        ).filter(User.id == user_id).first()
+        
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="用户不存在"
+            )
+        
+        user = CurrentUser(
+            id=row.id,
+            email=row.email,
+            is_admin=bool(row.is_admin),
+            status=row.status.value if row.status else "active"
         )
+        _user_cache.set(user_id, user)
+        metrics.inc("auth_cache_misses")
+    else:
+        metrics.inc("auth_cache_hits")
     
     if user.status != "active":
         raise HTTPException(
@@ -72,8 +146,8 @@ async def get_current_user(
     return user
 
 async def get_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
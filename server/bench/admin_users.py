@@ -0,0 +1,108 @@
+# /admin/users 基准: 原实现 (全部用户 + 每个用户一次 COUNT) 对比当前实现 (计数器列 + 分页排序的单条查询)
+# 写入 N 个合成用户及其书签，统计每种请求的语句数与耗时，结束后删除
+#   DB_NAME=bookmark_sync_bench python bench/admin_users.py --users 10000 --bookmarks-per-user 20
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+import common
+from models import SessionLocal, User, Bookmark, UserStatus
+from routers.admin import list_users
+from sync import url_hash
+
+def legacy_list_users(db):
+    """原实现: 加载全部用户 ORM 实体，逐个统计书签数"""
+    users = db.query(User).order_by(User.created_at.desc()).all()
+    result = []
+    for user in users:
+        bookmark_count = db.query(Bookmark).filter(
+            Bookmark.user_id == user.id,
+            Bookmark.deleted_at.is_(None)
+        ).count()
+        result.append((user.id, user.email, bookmark_count))
+    return result
+
+def seed(db, users: int, per_user: int) -> list:
+    """批量写入用户与书签，计数器直接按写入的书签数设置"""
+    rng = random.Random(1)
+    tag = f"bench-admin-{int(time.time())}"
+    now = datetime.utcnow()
+    for start in range(0, users, 1000):
+        rows = []
+        for i in range(start, min(start + 1000, users)):
+            rows.append({
+                "email": f"{tag}-{i}@example.com",
+                "password_hash": "!",
+                "is_admin": False,
+                "status": UserStatus.active,
+                "created_at": now - timedelta(minutes=i),
+                "last_sync_at": now - timedelta(minutes=rng.randint(0, 100000)),
+                "bookmark_count": 0
+            })
+        db.execute(insert(User), rows)
+        db.commit()
+    user_ids = [row.id for row in db.query(User.id).filter(User.email.startswith(tag)).order_by(User.id)]
+    
+    pending = []
+    for user_id in user_ids:
+        count = rng.randint(0, per_user * 2)
+        for i in range(count):
+            url = f"https://example.com/{user_id}/{i}"
+            pending.append({"user_id": user_id, "url": url, "url_hash": url_hash(url), "title": f"Bookmark {i}"})
+        db.query(User).filter(User.id == user_id).update({User.bookmark_count: count}, synchronize_session=False)
+        if len(pending) >= 5000:
+            db.execute(insert(Bookmark), pending)
+            db.commit()
+            pending = []
+    if pending:
+        db.execute(insert(Bookmark), pending)
+    db.commit()
+    return user_ids
+
+def timed(fn):
+    db = SessionLocal()
+    try:
+        with common.count_statements() as counter:
+            start = time.perf_counter()
+            fn(db)
+            elapsed = time.perf_counter() - start
+        return elapsed, counter[0]
+    finally:
+        db.close()
+
+def current(sort: str, q=None, page: int = 1):
+    return lambda db: list_users(page=page, page_size=20, sort=sort, order="desc", q=q, admin=None, db=db)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--bookmarks-per-user", type=int, default=20, help="平均每个用户的书签数")
+    args = parser.parse_args()
+    
+    common.init_db()
+    db = SessionLocal()
+    user_ids = seed(db, args.users, args.bookmarks_per_user)
+    print(f"seeded {len(user_ids)} users")
+    try:
+        cases = [
+            ("legacy (all users)", legacy_list_users),
+            ("created_at, page 1", current("created_at")),
+            ("created_at, page 100", current("created_at", page=100)),
+            ("last_sync_at, page 1", current("last_sync_at")),
+            ("bookmark_count, page 1", current("bookmark_count")),
+            ("email search", current("created_at", q="-42")),
+        ]
+        rows = []
+        for name, fn in cases:
+            elapsed, statements = timed(fn)
+            rows.append([name, statements, elapsed * 1000])
+        common.print_table(["request", "statements", "ms"], rows)
+    finally:
+        common.drop_users(db, user_ids)
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# AI 分析阶段基准: 每个网页一次请求 (analyze_with_ai，并发 10) 对比多网页合并请求 (analyze_batch_with_ai)
+# 本地桩 LLM 服务按 首 token 延迟 + 输出 token 数 × 每 token 延迟 模拟响应时间，可按比例遗漏合并请求中的项以触发单个回退
+# 统计请求数、发送的输入 token 估算总数 (系统提示词在每次请求中重复)、回退数与总耗时，不需要数据库
+#   python bench/ai_batch.py --urls 100 --ttft 300 --per-token 10 --drop 0.05
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import common
+import http_client
+import metrics
+from routers import analyze
+from stub_server import StubServer
+
+HOST = "127.0.0.1"
+CATEGORIES = ["开发工具", "前端", "后端", "数据库", "机器学习", "设计", "新闻", "阅读", "视频", "购物"] * 3
+
+def synthetic_pages(count: int):
+    rng = random.Random(1)
+    words = ["性能", "缓存", "数据库", "索引", "异步", "python", "fastapi", "mysql", "教程", "指南", "release", "notes"]
+    return [
+        {
+            "url": f"https://site-{i % 37}.example.com/post/{i}",
+            "title": f"文章 {i}: " + " ".join(rng.choice(words) for _ in range(6)),
+            "description": " ".join(rng.choice(words) for _ in range(20)),
+            "keywords": ", ".join(rng.sample(words, 4)),
+            "h1": " ".join(rng.choice(words) for _ in range(5)),
+            "text": " ".join(rng.choice(words) for _ in range(80))[:500]
+        }
+        for i in range(count)
+    ]
+
+class StubLLM:
+    """OpenAI 兼容的 chat-completions 桩服务"""
+    
+    def __init__(self, ttft: float, per_token: float, drop: float):
+        self.ttft = ttft
+        self.per_token = per_token
+        self.drop = drop
+        self.rng = random.Random(2)
+        self.input_tokens = 0
+    
+    async def handle(self, method: str, path: str, body: bytes):
+        request = json.loads(body)
+        system, user = (message["content"] for message in request["messages"])
+        self.input_tokens += analyze.estimate_tokens(system) + analyze.estimate_tokens(user)
+        
+        if system.endswith(analyze.BATCH_OUTPUT):
+            indexes = [int(i) for i in re.findall(r"^### 序号 (\d+)$", user, re.M)]
+            content = json.dumps([
+                {"i": i, "name": f"书签 {i} - 基准测试", "category": "开发工具", "isNew": False}
+                for i in indexes if self.rng.random() >= self.drop
+            ], ensure_ascii=False)
+        else:
+            content = json.dumps({"name": "书签 - 基准测试", "category": "开发工具", "isNew": False}, ensure_ascii=False)
+        
+        await asyncio.sleep(self.ttft + analyze.estimate_tokens(content) * self.per_token)
+        reply = {"choices": [{"message": {"role": "assistant", "content": content}}]}
+        return 200, "application/json", json.dumps(reply).encode("utf-8")
+
+async def per_url(pages, api_config):
+    # 与 batch_analyze 相同的并发上限
+    semaphore = asyncio.Semaphore(10)
+    
+    async def one(page):
+        async with semaphore:
+            return await analyze.analyze_with_ai(http_client.ai_client(), page, CATEGORIES, "normal", api_config)
+    
+    return await asyncio.gather(*(one(page) for page in pages))
+
+async def batched(pages, api_config):
+    return await analyze.analyze_batch_with_ai(
+        http_client.ai_client(), pages, CATEGORIES, "normal", api_config, asyncio.Semaphore(10)
+    )
+
+async def main(args):
+    llm = StubLLM(args.ttft / 1000, args.per_token / 1000, args.drop)
+    server = StubServer(llm.handle, [HOST])
+    await server.start()
+    api_config = analyze.ApiConfig(apiUrl=server.url(HOST, "/v1/chat/completions"), apiKey="bench")
+    pages = synthetic_pages(args.urls)
+    
+    rows = []
+    http_client.start()
+    try:
+        for name, run in (("per-url", per_url), ("batched", batched)):
+            # 每种方式都从空缓存开始
+            analyze._ai_cache.clear()
+            server.reset()
+            llm.input_tokens = 0
+            fallbacks = metrics.snapshot().get("ai_batch_fallbacks", 0)
+            start = time.perf_counter()
+            results = await run(pages, api_config)
+            elapsed = time.perf_counter() - start
+            assert all("error" not in result for result in results)
+            fallbacks = metrics.snapshot().get("ai_batch_fallbacks", 0) - fallbacks
+            rows.append([name, server.requests, llm.input_tokens, fallbacks, elapsed])
+    finally:
+        await http_client.close()
+        await server.stop()
+    
+    print(f"{args.urls} pages, ttft={args.ttft}ms, per_token={args.per_token}ms, drop={args.drop}, "
+          f"AI_BATCH_MAX_ITEMS={analyze.settings.AI_BATCH_MAX_ITEMS}, AI_BATCH_TOKEN_BUDGET={analyze.settings.AI_BATCH_TOKEN_BUDGET}")
+    common.print_table(["mode", "requests", "input_tokens", "fallbacks", "wall_s"], rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", type=int, default=100)
+    parser.add_argument("--ttft", type=float, default=300, help="首 token 延迟 (毫秒)")
+    parser.add_argument("--per-token", type=float, default=10, help="每个输出 token 的延迟 (毫秒)")
+    parser.add_argument("--drop", type=float, default=0.05, help="合并请求中模型遗漏某项的概率")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+# 同步负载格式基准: 现有 JSON (每个书签一个对象) 对比列式 JSON / msgpack，以及 gzip、zstd 压缩
+# 统计编码后字节数、编码耗时 (书签列表 → 传输字节) 与解码耗时 (传输字节 → 书签列表)，不需要数据库
+#   python bench/codec_size.py [1000 10000 100000]
+import json
+import sys
+
+import common
+import codec
+
+def plain_encode(items):
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def plain_decode(body):
+    return json.loads(body)
+
+def formats():
+    """(名称, 编码函数, 解码函数)"""
+    result = []
+    for media_type, name in ((None, "json"), (codec.COLUMNAR_JSON, "columnar+json"), (codec.COLUMNAR_MSGPACK, "columnar+msgpack")):
+        if media_type is None:
+            encode, decode = plain_encode, plain_decode
+        else:
+            encode = lambda items, t=media_type: codec.dumps(codec.encode_columns(items), t)
+            decode = lambda body, t=media_type: codec.decode_columns(codec.loads(body, t))
+        result.append((name, encode, decode))
+        for encoding in ("gzip", "zstd") if codec.zstandard else ("gzip",):
+            result.append((
+                f"{name}+{encoding}",
+                lambda items, e=encode, c=encoding: codec.compress(e(items), c),
+                lambda body, d=decode, c=encoding: d(codec.decompress(body, c))
+            ))
+    return result
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    if codec.zstandard is None:
+        print("zstandard 未安装，跳过 zstd", file=sys.stderr)
+    rows = []
+    for size in sizes:
+        items = common.synthetic_bookmarks(size)
+        baseline = None
+        for name, encode, decode in formats():
+            body = encode(items)
+            assert [item["url"] for item in decode(body)] == [item["url"] for item in items]
+            baseline = baseline or len(body)
+            rows.append([
+                size, name, len(body), f"{len(body) / baseline:.1%}",
+                common.best_of(lambda: encode(items)) * 1000,
+                common.best_of(lambda: decode(body)) * 1000
+            ])
+    common.print_table(["bookmarks", "format", "bytes", "vs_json", "encode_ms", "decode_ms"], rows)
+
+if __name__ == "__main__":
+    main()
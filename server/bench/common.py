@@ -0,0 +1,131 @@
+# 基准测试脚本的公共工具: 计时、峰值内存、语句计数、合成书签、测试库与测试用户
+# 脚本均在 server/ 目录下运行，例如: python bench/merge_write.py
+# 需要数据库的脚本只允许连接库名包含 bench 的测试库 (DB_NAME=bookmark_sync_bench)，
+# 会写入书签、同步日志和每日统计，结束后删除自己创建的用户及其数据
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_settings
+
+settings = get_settings()
+
+def best_of(fn: Callable[[], Any], repeat: int = 3) -> float:
+    """执行 repeat 次，返回最短耗时 (秒)"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    """执行一次，返回期间 Python 分配的峰值字节数 (tracemalloc，单独执行以免影响计时)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """延迟列表 (秒) → 毫秒的 p50/p99/max"""
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0
+    }
+
+def mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+def print_table(headers: Sequence[str], rows: List[Sequence[Any]]):
+    cells = [[str(h) for h in headers]] + [[f"{v:.3f}" if isinstance(v, float) else str(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        print("  ".join(value.rjust(widths[i]) for i, value in enumerate(row)))
+        if n == 0:
+            print("  ".join("-" * w for w in widths))
+
+def synthetic_bookmarks(count: int, folders: int = 200, seed: int = 1) -> List[Dict[str, Any]]:
+    """客户端格式的合成书签: 文件夹路径在书签之间大量重复，与真实书签树相近"""
+    rng = random.Random(seed)
+    paths = [
+        "/".join(["书签栏"] + [f"folder-{rng.randint(0, 999)}" for _ in range(rng.randint(1, 4))])
+        for _ in range(folders)
+    ]
+    base = 1_600_000_000_000
+    return [
+        {
+            "id": str(i + 1),
+            "url": f"https://site-{rng.randint(0, count // 4 + 1)}.example.com/articles/{i}?ref=bench",
+            "title": f"Bookmark {i} " + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(rng.randint(10, 60))),
+            "folderPath": rng.choice(paths),
+            "dateAdded": base + i * 1000,
+            "deleted": False
+        }
+        for i in range(count)
+    ]
+
+def require_bench_db():
+    """拒绝在非测试库上运行"""
+    if "bench" not in settings.DB_NAME:
+        sys.exit(f"DB_NAME={settings.DB_NAME}: 请在测试库上运行，例如 DB_NAME=bookmark_sync_bench")
+
+def init_db():
+    """建表并执行迁移 (与 main.py 启动时相同)"""
+    require_bench_db()
+    from models import Base, engine
+    import migrations
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+
+@contextmanager
+def count_statements() -> Iterator[List[int]]:
+    """统计期间发往数据库的语句数 (executemany 计为一条)，结果在 counter[0]"""
+    from sqlalchemy import event
+    from models import engine
+    counter = [0]
+    
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+    
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+def create_user(db, prefix: str = "bench") -> int:
+    from models import User
+    user = User(email=f"{prefix}-{uuid.uuid4().hex[:12]}@example.com", password_hash="!")
+    db.add(user)
+    db.commit()
+    return user.id
+
+def drop_users(db, user_ids: List[int]):
+    """删除测试用户及其书签、同步日志、日汇总 (外键不级联，按依赖顺序删除)"""
+    from models import User, Bookmark, SyncLog, SyncLogDaily
+    for model, column in ((Bookmark, Bookmark.user_id), (SyncLog, SyncLog.user_id), (SyncLogDaily, SyncLogDaily.user_id), (User, User.id)):
+        for i in range(0, len(user_ids), 1000):
+            db.query(model).filter(column.in_(user_ids[i:i + 1000])).delete(synchronize_session=False)
+            db.commit()
@@ -0,0 +1,138 @@
+# 网页提取基准: 原实现 (读取完整响应体 + BeautifulSoup 整树解析) 对比 extract.extract_stream (增量解析，字段齐全或读满上限即停止)
+# 对一组保存的网页逐个统计 CPU 时间、峰值内存 (tracemalloc) 与实际读取的字节数，不需要网络和数据库
+# 不指定 --corpus 时生成一组典型网页 (普通文章、大段内联脚本的单页应用、无 h1 的长页面、GBK 编码、超长列表)
+# 对比原实现需要 beautifulsoup4 (已不在服务端依赖中): pip install -r bench/requirements.txt
+#   python bench/extract_pages.py [--corpus 保存网页的目录 (*.html)]
+import argparse
+import asyncio
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, Dict, List
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:  # 未安装时只测量当前实现
+    BeautifulSoup = None
+
+import common
+import extract
+from config import get_settings
+
+settings = get_settings()
+
+CHUNK_SIZE = 64 * 1024
+
+def legacy_extract(chunks: List[bytes]) -> Dict[str, str]:
+    """原实现: 拼接完整响应体，解码后构建整棵 BeautifulSoup 树"""
+    html = b"".join(chunks).decode("utf-8", errors="replace")
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else ""
+    desc_tag = soup.find("meta", attrs={"name": "description"})
+    keywords_tag = soup.find("meta", attrs={"name": "keywords"})
+    h1_tag = soup.find("h1")
+    result = {
+        "title": title,
+        "description": desc_tag.get("content", "").strip() if desc_tag else "",
+        "keywords": keywords_tag.get("content", "").strip() if keywords_tag else "",
+        "h1": h1_tag.get_text().strip() if h1_tag else ""
+    }
+    for tag in soup(["script", "style", "nav", "footer", "header", "aside", "noscript"]):
+        tag.decompose()
+    result["text"] = " ".join(soup.get_text().split())[:500]
+    return result
+
+def stream_extract(chunks: List[bytes], read: List[int]) -> Dict[str, str]:
+    async def body() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            read[0] += len(chunk)
+            yield chunk
+    return asyncio.run(extract.extract_stream(body(), "text/html", settings.PAGE_FETCH_MAX_BYTES))
+
+def generate_corpus(directory: str):
+    rng = random.Random(1)
+    words = "performance cache index stream parser memory latency throughput benchmark bookmark".split()
+    
+    def paragraphs(count: int) -> str:
+        return "".join(f"<p>{' '.join(rng.choice(words) for _ in range(60))}</p>\n" for _ in range(count))
+    
+    head = ('<head><meta charset="utf-8"><title>{title}</title>'
+            '<meta name="description" content="A saved page for the extraction benchmark">'
+            '<meta name="keywords" content="bench, extract"></head>')
+    nav = "<nav>" + "".join(f'<a href="/n/{i}">Link {i}</a>' for i in range(200)) + "</nav>"
+    pages = {
+        "article.html": f"<html>{head.format(title='Article')}<body>{nav}<h1>An article</h1>{paragraphs(120)}</body></html>",
+        "spa.html": (
+            f"<html>{head.format(title='Single page app')}<body><script>window.__STATE__ = "
+            + "{" + ",".join(f'"k{i}": "{"x" * 200}"' for i in range(10000)) + "}"
+            + f"</script><div id=app><h1>App</h1>{paragraphs(10)}</div></body></html>"
+        ),
+        "no-h1.html": f"<html>{head.format(title='No heading')}<body>{nav}{paragraphs(2000)}</body></html>",
+        "list.html": (
+            f"<html>{head.format(title='Long list')}<body><h1>Index</h1><table>"
+            + "".join(f"<tr><td>{i}</td><td>{' '.join(rng.choice(words) for _ in range(12))}</td></tr>" for i in range(60000))
+            + "</table></body></html>"
+        ),
+    }
+    for name, html in pages.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+    gbk = ('<html><head><meta charset="gbk"><title>中文网页</title><meta name="description" content="编码测试">'
+           '</head><body><h1>标题</h1><p>' + "书签同步性能测试" * 200 + "</p></body></html>")
+    with open(os.path.join(directory, "gbk.html"), "wb") as f:
+        f.write(gbk.encode("gbk"))
+
+def cpu_time(fn, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="保存网页的目录，缺省时生成示例网页")
+    args = parser.parse_args()
+    
+    directory = args.corpus or tempfile.mkdtemp(prefix="bench-pages-")
+    if not args.corpus:
+        generate_corpus(directory)
+    
+    if BeautifulSoup is None:
+        print("beautifulsoup4 未安装，跳过原实现对比 (pip install -r bench/requirements.txt)", file=sys.stderr)
+    
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            raw = f.read()
+        chunks = [raw[i:i + CHUNK_SIZE] for i in range(0, len(raw), CHUNK_SIZE)]
+        read = [0]
+        streamed = stream_extract(chunks, read)
+        row = [
+            os.path.basename(path),
+            f"{len(raw) // 1024} KiB",
+            f"{read[0] // 1024} KiB",
+            cpu_time(lambda: stream_extract(chunks, [0])) * 1000,
+            common.mib(common.peak_memory(lambda: stream_extract(chunks, [0])))
+        ]
+        if BeautifulSoup is not None:
+            legacy = legacy_extract(chunks)
+            row += [
+                cpu_time(lambda: legacy_extract(chunks)) * 1000,
+                common.mib(common.peak_memory(lambda: legacy_extract(chunks))),
+                "yes" if (legacy["title"], legacy["h1"]) == (streamed["title"], streamed["h1"]) else "no"
+            ]
+        rows.append(row)
+    
+    headers = ["page", "size", "stream_read", "stream_cpu_ms", "stream_peak"]
+    if BeautifulSoup is not None:
+        headers += ["bs4_cpu_ms", "bs4_peak", "same_title_h1"]
+    common.print_table(headers, rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# 连接复用基准: 连续多个 100 URL 的批量分析，对本地桩服务抓取网页并调用 AI 接口，不需要数据库
+# - per-batch: 原实现，每次 batch_analyze 新建 httpx.AsyncClient，批次结束即关闭，下一批重新握手
+# - shared: 当前实现，http_client 的应用级连接池 (page_client/ai_client + host_limiter)，跨批次复用连接
+# 统计服务端按网页站点/AI 接口分别建立的连接数 (TCP/TLS 握手次数) 与总耗时
+#   python bench/http_pool.py --batches 5 --urls 100 --sites 10 --tls
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+import httpx
+
+import common
+from stub_server import StubServer, loopback_hosts
+
+AI_HOST = "127.0.0.1"
+PAGE = ("<html><head><title>Stub page</title><meta name=\"description\" content=\"stub\"></head><body><h1>Stub</h1>"
+        + "<p>lorem ipsum dolor sit amet</p>" * 500 + "</body></html>").encode("utf-8")
+AI_RESPONSE = json.dumps({"choices": [{"message": {"content": "{\"category\": \"stub\"}"}}]}).encode("utf-8")
+
+def make_handler(delay: float):
+    async def handler(method: str, path: str, body: bytes):
+        await asyncio.sleep(delay)
+        if method == "POST":
+            return 200, "application/json", AI_RESPONSE
+        return 200, "text/html; charset=utf-8", PAGE
+    return handler
+
+async def process(page_client: httpx.AsyncClient, ai_client: httpx.AsyncClient, url: str, ai_url: str):
+    """与 process_url 相同的请求序列: 抓取网页，再调用一次 AI 接口"""
+    response = await page_client.get(url)
+    response.raise_for_status()
+    response = await ai_client.post(ai_url, json={"messages": [{"role": "user", "content": url}]})
+    response.raise_for_status()
+
+async def per_batch(batches: List[List[str]], ai_url: str):
+    for urls in batches:
+        async with httpx.AsyncClient() as client:
+            await asyncio.gather(*[process(client, client, url, ai_url) for url in urls])
+
+async def shared(batches: List[List[str]], ai_url: str):
+    import http_client
+    
+    async def limited(url: str):
+        async with http_client.host_limiter.slot(url):
+            await process(http_client.page_client(), http_client.ai_client(), url, ai_url)
+    
+    http_client.start()
+    try:
+        for urls in batches:
+            await asyncio.gather(*[limited(url) for url in urls])
+    finally:
+        await http_client.close()
+
+async def main(args):
+    sites = loopback_hosts(args.sites)
+    server = StubServer(make_handler(args.delay / 1000), sites + [AI_HOST], tls=args.tls, connect_delay=args.connect_delay / 1000)
+    if server.cert_file:
+        # httpx 默认 trust_env，用 SSL_CERT_FILE 信任自签名证书，两种方式的客户端都无需改动
+        os.environ["SSL_CERT_FILE"] = server.cert_file
+    await server.start()
+    
+    ai_url = server.url(AI_HOST, "/v1/chat/completions")
+    batches = [
+        [server.url(sites[i % len(sites)], f"/batch-{b}/page-{i}") for i in range(args.urls)]
+        for b in range(args.batches)
+    ]
+    rows = []
+    try:
+        for name, run in (("per-batch", per_batch), ("shared", shared)):
+            server.reset()
+            start = time.perf_counter()
+            await run(batches, ai_url)
+            elapsed = time.perf_counter() - start
+            ai_connections = server.connections_by_host.get(AI_HOST, 0)
+            rows.append([
+                name, server.requests, server.connections - ai_connections, ai_connections,
+                elapsed, elapsed / args.batches * 1000
+            ])
+    finally:
+        await server.stop()
+    
+    print(f"{args.batches} batches x {args.urls} URLs over {args.sites} sites, {server.scheme}, "
+          f"connect_delay={args.connect_delay}ms, response_delay={args.delay}ms")
+    common.print_table(["client", "requests", "page_conns", "ai_conns", "total_s", "ms_per_batch"], rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--urls", type=int, default=100, help="每批 URL 数")
+    parser.add_argument("--sites", type=int, default=10, help="URL 分布的站点数")
+    parser.add_argument("--delay", type=float, default=20, help="桩服务每个响应的延迟 (毫秒)")
+    parser.add_argument("--connect-delay", type=float, default=50, help="每个新连接的握手延迟 (毫秒)")
+    parser.add_argument("--tls", action="store_true", help="使用 HTTPS (需要 cryptography)")
+    asyncio.run(main(parser.parse_args()))
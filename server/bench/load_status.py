@@ -0,0 +1,92 @@
+# 事件循环阻塞基准: 对运行中的服务测量 /api/status 与 /health 的延迟，先空闲，再在多个大书签同步并发执行时
+# 数据库路由在事件循环线程中执行时，一次 smart_merge 会拖慢同一 worker 上的所有请求；
+# 在线程池中执行时 /api/status 的 p99 应与空闲时接近。分别对旧版本与当前版本的服务运行即可对比
+# 会通过 /api/register 注册测试用户，请对测试环境运行:
+#   python bench/load_status.py --base-url http://localhost:8000 --syncs 4 --bookmarks 20000 --duration 20
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+import common
+
+async def register(client: httpx.AsyncClient) -> Dict[str, str]:
+    response = await client.post("/api/register", json={
+        "email": f"bench-{uuid.uuid4().hex[:12]}@example.com",
+        "password": uuid.uuid4().hex
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+async def probe(client: httpx.AsyncClient, path: str, headers: Dict[str, str], until: float, latencies: List[float]):
+    """串行请求直到 until，记录每次延迟"""
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        await asyncio.sleep(0.01)
+
+async def sync_loop(client: httpx.AsyncClient, headers: Dict[str, str], bookmarks: List[Dict], stop: asyncio.Event, done: List[int]):
+    """反复全量同步；每轮修改 10% 标题并使用当前时间戳，保证每次都有写入"""
+    round_no = 0
+    while not stop.is_set():
+        round_no += 1
+        now_ms = int(time.time() * 1000)
+        payload = [
+            {**bm, "title": f"{bm['title']} #{round_no}", "dateAdded": now_ms} if i % 10 == 0 else bm
+            for i, bm in enumerate(bookmarks)
+        ]
+        response = await client.post("/api/sync", json={"bookmarks": payload}, headers=headers)
+        response.raise_for_status()
+        done[0] += 1
+
+async def measure(client: httpx.AsyncClient, headers: Dict[str, str], probes: int, duration: float) -> Dict[str, List[float]]:
+    until = time.perf_counter() + duration
+    latencies = {"/api/status": [], "/health": []}
+    await asyncio.gather(*[
+        probe(client, path, headers if path != "/health" else {}, until, latencies[path])
+        for path in latencies
+        for _ in range(probes)
+    ])
+    return latencies
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.syncs + 2 * args.probes + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600, limits=limits) as client:
+        probe_headers = await register(client)
+        sync_headers = [await register(client) for _ in range(args.syncs)]
+        
+        rows = []
+        idle = await measure(client, probe_headers, args.probes, args.duration)
+        for path, values in idle.items():
+            rows.append(["idle", path, len(values)] + list(common.summary(values).values()))
+        
+        stop = asyncio.Event()
+        done = [0]
+        syncs = [
+            asyncio.create_task(sync_loop(client, headers, common.synthetic_bookmarks(args.bookmarks, seed=n), stop, done))
+            for n, headers in enumerate(sync_headers)
+        ]
+        # 等首轮同步进入合并阶段
+        await asyncio.sleep(1)
+        loaded = await measure(client, probe_headers, args.probes, args.duration)
+        stop.set()
+        await asyncio.gather(*syncs)
+        for path, values in loaded.items():
+            rows.append([f"{args.syncs} syncs", path, len(values)] + list(common.summary(values).values()))
+    
+    common.print_table(["load", "endpoint", "requests", "p50_ms", "p99_ms", "max_ms", "mean_ms"], rows)
+    print(f"completed syncs of {args.bookmarks} bookmarks: {done[0]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--syncs", type=int, default=4, help="并发执行大同步的客户端数")
+    parser.add_argument("--bookmarks", type=int, default=20000, help="每次同步的书签数")
+    parser.add_argument("--probes", type=int, default=4, help="每个探测端点的并发数")
+    parser.add_argument("--duration", type=float, default=20, help="每个阶段的秒数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,61 @@
+# 合并结果构建基准: 无变更的再次同步，比较三种构建 merged_bookmarks 的方式的耗时与峰值内存
+# - reload: 原实现，提交后重新查询全部 ORM 实体，再逐个包装为 BookmarkItem
+# - incremental: smart_merge(collect=True)，由合并时已读入的云端行 + 已应用的变更构建
+# - columns: 回退路径，只取列的查询 (sync.live_items_query)
+# 三者的合并写入部分相同 (无变更时不写书签)，差异只来自结果构建
+#   DB_NAME=bookmark_sync_bench python bench/merge_result.py [1000 10000 100000]
+import sys
+
+import common
+from models import SessionLocal, Bookmark
+from routers.bookmark import BookmarkItem
+from sync import smart_merge, live_items_query, bookmark_to_item
+
+def reload_result(db, user_id: int, bookmarks):
+    smart_merge(db, user_id, bookmarks, collect=False)
+    merged = db.query(Bookmark).filter(
+        Bookmark.user_id == user_id,
+        Bookmark.deleted_at.is_(None)
+    ).all()
+    return [BookmarkItem(**bookmark_to_item(bm)) for bm in merged]
+
+def incremental_result(db, user_id: int, bookmarks):
+    return smart_merge(db, user_id, bookmarks).merged_bookmarks
+
+def columns_result(db, user_id: int, bookmarks):
+    smart_merge(db, user_id, bookmarks, collect=False)
+    return [bookmark_to_item(row) for row in live_items_query(db, user_id)]
+
+VARIANTS = (("reload", reload_result), ("incremental", incremental_result), ("columns", columns_result))
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    common.init_db()
+    rows = []
+    for size in sizes:
+        bookmarks = common.synthetic_bookmarks(size)
+        db = SessionLocal()
+        user_id = common.create_user(db)
+        try:
+            # 首次同步写入全部书签，之后每次都是无变更的全量同步
+            smart_merge(db, user_id, bookmarks, collect=False)
+            for name, build in VARIANTS:
+                def once():
+                    # 新会话: 原实现的 ORM 实体不会因上一轮留在 identity map 中而被复用
+                    session = SessionLocal()
+                    try:
+                        assert len(build(session, user_id, bookmarks)) == size
+                    finally:
+                        session.close()
+                
+                elapsed = common.best_of(once)
+                peak = common.peak_memory(once)
+                rows.append([size, name, elapsed, common.mib(peak)])
+                print(f"{size} {name} done", file=sys.stderr)
+        finally:
+            common.drop_users(db, [user_id])
+            db.close()
+    common.print_table(["bookmarks", "result", "sync_s", "peak_memory"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# smart_merge 写入路径基准: 逐行 ORM 修改 (原实现) 对比批量语句 (sync.smart_merge)
+# 场景: 首次同步 (全部新增)、再次同步 (10% 修改)，各规模分别统计耗时与语句数
+#   DB_NAME=bookmark_sync_bench python bench/merge_write.py [1000 10000 100000]
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import common
+from models import SessionLocal, Bookmark
+from sync import smart_merge
+
+def legacy_merge(db, user_id: int, local_bookmarks: List[Dict[str, Any]]):
+    """原实现的写入部分: 加载 ORM 实体，逐个修改属性，新书签逐个 db.add"""
+    cloud_by_url = {
+        bm.url: bm for bm in db.query(Bookmark).filter(
+            Bookmark.user_id == user_id,
+            Bookmark.deleted_at.is_(None)
+        ).all() if bm.url
+    }
+    for local_bm in local_bookmarks:
+        url = local_bm.get("url")
+        if not url:
+            continue
+        cloud_bm = cloud_by_url.get(url)
+        if cloud_bm is not None:
+            if local_bm.get("deleted", False):
+                cloud_bm.deleted_at = datetime.utcnow()
+            else:
+                cloud_updated = cloud_bm.updated_at.timestamp() * 1000 if cloud_bm.updated_at else 0
+                if local_bm.get("dateAdded", 0) > cloud_updated:
+                    cloud_bm.title = local_bm.get("title", "")
+                    cloud_bm.folder_path = local_bm.get("folderPath", "")
+                    cloud_bm.chrome_id = local_bm.get("id", "")
+                    cloud_bm.updated_at = datetime.utcnow()
+        elif not local_bm.get("deleted", False):
+            db.add(Bookmark(
+                user_id=user_id,
+                chrome_id=local_bm.get("id", ""),
+                url=url,
+                title=local_bm.get("title", ""),
+                folder_path=local_bm.get("folderPath", "")
+            ))
+    db.commit()
+
+def batched_merge(db, user_id: int, local_bookmarks: List[Dict[str, Any]]):
+    smart_merge(db, user_id, local_bookmarks, collect=False)
+
+def modified(bookmarks: List[Dict[str, Any]], ratio: float = 0.1) -> List[Dict[str, Any]]:
+    """每 1/ratio 个书签改一次标题，时间戳晚于云端 updated_at"""
+    now_ms = int(time.time() * 1000) + 60_000
+    step = int(1 / ratio)
+    return [
+        {**bm, "title": bm["title"] + " (edited)", "dateAdded": now_ms} if i % step == 0 else bm
+        for i, bm in enumerate(bookmarks)
+    ]
+
+def run(merge, size: int) -> List[Any]:
+    bookmarks = common.synthetic_bookmarks(size)
+    db = SessionLocal()
+    user_id = common.create_user(db)
+    row = []
+    try:
+        for payload in (bookmarks, modified(bookmarks)):
+            with common.count_statements() as counter:
+                start = time.perf_counter()
+                merge(db, user_id, payload)
+                elapsed = time.perf_counter() - start
+            row += [elapsed, counter[0]]
+            # 每个场景在新会话中开始，不复用上一轮的 identity map
+            db.close()
+            db = SessionLocal()
+    finally:
+        common.drop_users(db, [user_id])
+        db.close()
+    return row
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    common.init_db()
+    rows = []
+    for size in sizes:
+        for name, merge in (("legacy", legacy_merge), ("batched", batched_merge)):
+            rows.append([size, name] + run(merge, size))
+            print(f"{size} {name} done", file=sys.stderr)
+    common.print_table(
+        ["bookmarks", "engine", "first_sync_s", "first_stmts", "resync_10pct_s", "resync_stmts"],
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
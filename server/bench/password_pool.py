@@ -0,0 +1,124 @@
+# bcrypt 基准: 登录洪峰期间的登录吞吐量与其它请求的延迟，不需要数据库
+# - inline: 原实现，async def 路由中直接调用 bcrypt，占用事件循环
+# - pool: 当前实现，def 路由 + auth.verify_password (有界 bcrypt 线程池，饱和时 429)
+# 每种方式启动一个本地 uvicorn，并发发起登录的同时串行请求轻量接口 /ping 测延迟
+#   python bench/password_pool.py --logins 200 --concurrency 50
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from typing import Any, Dict, List
+
+import bcrypt
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+import common
+from auth import verify_password, settings
+
+PASSWORD = "correct horse battery staple"
+
+def legacy_verify(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
+
+def build_app(mode: str, hashed: str) -> FastAPI:
+    app = FastAPI()
+    
+    if mode == "inline":
+        @app.post("/login")
+        async def login_inline():
+            if not legacy_verify(PASSWORD, hashed):
+                raise HTTPException(status_code=401)
+            return {"ok": True}
+    else:
+        @app.post("/login")
+        def login_pool():
+            if not verify_password(PASSWORD, hashed):
+                raise HTTPException(status_code=401)
+            return {"ok": True}
+    
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+    
+    return app
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_load(base_url: str, logins: int, concurrency: int) -> Dict[str, Any]:
+    statuses: List[int] = []
+    pings: List[float] = []
+    finished = asyncio.Event()
+    queue = iter(range(logins))
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=concurrency + 2)) as client:
+        async def login_worker():
+            for _ in queue:
+                response = await client.post("/login")
+                statuses.append(response.status_code)
+        
+        async def ping_worker():
+            while not finished.is_set():
+                start = time.perf_counter()
+                await client.get("/ping")
+                pings.append(time.perf_counter() - start)
+                await asyncio.sleep(0.02)
+        
+        pinger = asyncio.create_task(ping_worker())
+        start = time.perf_counter()
+        await asyncio.gather(*[login_worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        finished.set()
+        await pinger
+    
+    ok = statuses.count(200)
+    return {
+        "elapsed": elapsed,
+        "ok": ok,
+        "rejected": statuses.count(429),
+        "logins_per_s": ok / elapsed,
+        **common.summary(pings)
+    }
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200, help="登录请求总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发登录客户端数")
+    args = parser.parse_args()
+    
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode("utf-8")
+    print(
+        f"BCRYPT_ROUNDS={settings.BCRYPT_ROUNDS} PASSWORD_HASH_WORKERS={settings.PASSWORD_HASH_WORKERS} "
+        f"PASSWORD_HASH_QUEUE={settings.PASSWORD_HASH_QUEUE}"
+    )
+    rows = []
+    for mode in ("inline", "pool"):
+        port = free_port()
+        server = serve(build_app(mode, hashed), port)
+        try:
+            result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.logins, args.concurrency))
+        finally:
+            server.should_exit = True
+        rows.append([
+            mode, result["ok"], result["rejected"], result["elapsed"], result["logins_per_s"],
+            result["p50_ms"], result["p99_ms"], result["max_ms"]
+        ])
+    common.print_table(
+        ["mode", "ok", "429", "elapsed_s", "logins_per_s", "ping_p50_ms", "ping_p99_ms", "ping_max_ms"],
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# 本地 HTTP/1.1 桩服务 (基准测试用): 支持 keep-alive 与可选 TLS，统计建立的连接数 (即握手次数) 和请求数
+# 同一端口监听多个回环地址 (127.0.0.2、127.0.0.3 ...)，客户端把它们当作不同站点，各自建立连接池
+# 本机握手几乎没有网络延迟，connect_delay 在每个新连接的首个请求前等待，模拟远程站点握手的往返时间
+import asyncio
+import datetime
+import ipaddress
+import os
+import socket
+import ssl
+import tempfile
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (方法, 路径, 请求体) → (状态码, Content-Type, 响应体)
+Handler = Callable[[str, str, bytes], Awaitable[Tuple[int, str, bytes]]]
+
+def loopback_hosts(count: int) -> List[str]:
+    """127.0.0.2 起的 count 个回环地址 (Linux 上整个 127.0.0.0/8 都指向本机)"""
+    return [f"127.0.0.{i + 2}" for i in range(count)]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def self_signed_cert(hosts: List[str]) -> Tuple[str, str]:
+    """生成覆盖 hosts 的自签名证书，返回 (证书文件, 私钥文件)；需要 cryptography"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench-stub")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address(h)) for h in hosts]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    directory = tempfile.mkdtemp(prefix="bench-stub-")
+    cert_file = os.path.join(directory, "cert.pem")
+    key_file = os.path.join(directory, "key.pem")
+    with open(cert_file, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    return cert_file, key_file
+
+class StubServer:
+    def __init__(self, handler: Handler, hosts: List[str], tls: bool = False, connect_delay: float = 0.0):
+        self.handler = handler
+        self.hosts = hosts
+        self.connect_delay = connect_delay
+        self.port = free_port()
+        self.cert_file: Optional[str] = None
+        self.ssl_context: Optional[ssl.SSLContext] = None
+        if tls:
+            self.cert_file, key_file = self_signed_cert(hosts)
+            self.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.ssl_context.load_cert_chain(self.cert_file, key_file)
+        self.connections = 0
+        self.requests = 0
+        self.connections_by_host: Dict[str, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    @property
+    def scheme(self) -> str:
+        return "https" if self.ssl_context else "http"
+    
+    def url(self, host: str, path: str) -> str:
+        return f"{self.scheme}://{host}:{self.port}{path}"
+    
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+        self.connections_by_host = {}
+    
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, host=self.hosts, port=self.port, ssl=self.ssl_context)
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        host = writer.get_extra_info("sockname")[0]
+        self.connections_by_host[host] = self.connections_by_host.get(host, 0) + 1
+        try:
+            if self.connect_delay:
+                await asyncio.sleep(self.connect_delay)
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                
+                self.requests += 1
+                code, content_type, payload = await self.handler(method, path, body)
+                writer.write(
+                    f"HTTP/1.1 {code} OK\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
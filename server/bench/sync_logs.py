@@ -0,0 +1,106 @@
+# 同步日志热点查询基准: 写入 N 行 (默认 1000 万) 分布在最近一年的同步日志，
+# 比较原查询与当前查询，再执行保留期压缩 (jobs.compact_sync_logs) 后重新测量
+# - 用户最近同步记录: (user_id, created_at) 复合索引 vs 不使用该索引 (原表只有 user_id 单列索引，迁移 6 已删除)
+# - 今日同步数: DATE(created_at) = 今天 的全表计数 vs daily_stats 当天分片之和
+# - 同步总数: sync_logs 全表计数 vs 用户计数器之和
+#   DB_NAME=bookmark_sync_bench python bench/sync_logs.py --rows 10000000 --users 10000
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+import common
+from models import SessionLocal, User, SyncLog, SyncAction, UserStatus
+from jobs import compact_sync_logs
+
+QUERIES = [
+    ("recent syncs (no composite index)", """
+        SELECT * FROM sync_logs IGNORE INDEX (ix_sync_logs_user_created)
+        WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 20"""),
+    ("recent syncs (user_id, created_at)", """
+        SELECT * FROM sync_logs
+        WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 20"""),
+    ("today_syncs: DATE(created_at) scan", """
+        SELECT COUNT(*) FROM sync_logs WHERE DATE(created_at) = UTC_DATE()"""),
+    ("today_syncs: daily_stats", """
+        SELECT COALESCE(SUM(syncs), 0) FROM daily_stats WHERE day = UTC_DATE()"""),
+    ("total_syncs: COUNT(*) sync_logs", """
+        SELECT COUNT(*) FROM sync_logs"""),
+    ("total_syncs: SUM(users.sync_count)", """
+        SELECT COALESCE(SUM(sync_count), 0) FROM users"""),
+]
+
+def seed(db, rows: int, users: int) -> list:
+    """批量写入用户与同步日志，日志时间均匀分布在最近 365 天"""
+    rng = random.Random(1)
+    tag = f"bench-logs-{int(time.time())}"
+    db.execute(insert(User), [
+        {"email": f"{tag}-{i}@example.com", "password_hash": "!", "is_admin": False, "status": UserStatus.active}
+        for i in range(users)
+    ])
+    db.commit()
+    user_ids = [row.id for row in db.query(User.id).filter(User.email.startswith(tag))]
+    
+    now = datetime.utcnow()
+    batch = []
+    for n in range(rows):
+        batch.append({
+            "user_id": rng.choice(user_ids),
+            "action": SyncAction.merge,
+            "added": rng.randint(0, 5),
+            "updated": rng.randint(0, 5),
+            "deleted": rng.randint(0, 2),
+            "conflicts": 0,
+            "created_at": now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        })
+        if len(batch) == 10000:
+            db.execute(insert(SyncLog), batch)
+            db.commit()
+            batch = []
+            if (n + 1) % 1_000_000 == 0:
+                print(f"seeded {n + 1} log rows")
+    if batch:
+        db.execute(insert(SyncLog), batch)
+        db.commit()
+    db.execute(text("ANALYZE TABLE sync_logs"))
+    return user_ids
+
+def measure(db, user_ids: list, label: str) -> list:
+    rng = random.Random(2)
+    rows = []
+    for name, sql in QUERIES:
+        statement = text(sql)
+        # 每次换一个用户，避免只测到缓冲池中同一批页
+        elapsed = common.best_of(lambda: db.execute(statement, {"user_id": rng.choice(user_ids)}).fetchall(), repeat=5)
+        rows.append([label, name, elapsed * 1000])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+    
+    common.init_db()
+    db = SessionLocal()
+    user_ids = seed(db, args.rows, args.users)
+    try:
+        total = db.execute(text("SELECT COUNT(*) FROM sync_logs")).scalar()
+        rows = measure(db, user_ids, f"{total} rows")
+        
+        start = time.perf_counter()
+        compacted = compact_sync_logs(db)
+        elapsed = time.perf_counter() - start
+        print(f"compact_sync_logs: {compacted} rows in {elapsed:.1f}s ({compacted / max(elapsed, 1e-9):.0f} rows/s)")
+        
+        total = db.execute(text("SELECT COUNT(*) FROM sync_logs")).scalar()
+        rows += measure(db, user_ids, f"{total} rows after compaction")
+        common.print_table(["table", "query", "ms"], rows)
+    finally:
+        common.drop_users(db, user_ids)
+        db.close()
+
+if __name__ == "__main__":
+    main()
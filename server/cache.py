@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+class TTLCache:
+    """线程安全的进程内 LRU 缓存，条目超过 ttl 秒后失效"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SingleFlight:
+    """
+    合并相同键的并发异步调用: 第一个调用者执行，其余调用者等待并共享其结果
+    仅在单个事件循环内使用
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否共享了其它调用者的结果)"""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # 执行者被取消 (而不是自己被取消) 时重新发起
+                if not future.cancelled():
+                    raise
+        
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 标记已读取，没有等待者时不输出警告
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
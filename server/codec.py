@@ -0,0 +1,275 @@
+import gzip
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+import msgpack
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+
+from config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # zstd 可选，未安装时只提供 gzip
+    zstandard = None
+
+settings = get_settings()
+
+# 紧凑同步格式: 列式编码 + 文件夹路径字典，避免每个书签重复键名和 folderPath
+COLUMNAR_JSON = "application/vnd.bookmark-sync.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.bookmark-sync.columnar+msgpack"
+COLUMNAR_TYPES = (COLUMNAR_MSGPACK, COLUMNAR_JSON)  # 按优先级
+FORMAT_VERSION = 1
+
+def encode_columns(items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    书签列表 → 列式结构
+    {"v": 1, "folders": [...], "id": [...], "url": [...], "title": [...],
+     "folder": [folders 下标], "dateAdded": [...], "deleted": [0/1] (可选)}
+    """
+    folders: List[str] = []
+    folder_index: Dict[str, int] = {}
+    ids, urls, titles, folder_refs, dates, deleted = [], [], [], [], [], []
+    has_deleted = False
+    
+    for item in items:
+        folder = item.get("folderPath") or ""
+        ref = folder_index.get(folder)
+        if ref is None:
+            ref = folder_index[folder] = len(folders)
+            folders.append(folder)
+        
+        ids.append(item.get("id"))
+        urls.append(item.get("url"))
+        titles.append(item.get("title"))
+        folder_refs.append(ref)
+        dates.append(item.get("dateAdded"))
+        if "deleted" in item:
+            has_deleted = True
+        deleted.append(1 if item.get("deleted") else 0)
+    
+    columns = {
+        "v": FORMAT_VERSION,
+        "folders": folders,
+        "id": ids,
+        "url": urls,
+        "title": titles,
+        "folder": folder_refs,
+        "dateAdded": dates,
+    }
+    if has_deleted:
+        columns["deleted"] = deleted
+    return columns
+
+def decode_columns(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """列式结构 → 书签列表"""
+    if columns.get("v") != FORMAT_VERSION:
+        raise ValueError(f"不支持的格式版本: {columns.get('v')}")
+    
+    folders = columns.get("folders", [])
+    urls = columns.get("url", [])
+    count = len(urls)
+    ids = columns.get("id") or [None] * count
+    titles = columns.get("title") or [None] * count
+    folder_refs = columns.get("folder") or [None] * count
+    dates = columns.get("dateAdded") or [None] * count
+    deleted = columns.get("deleted") or [0] * count
+    
+    return [
+        {
+            "id": ids[i],
+            "url": urls[i],
+            "title": titles[i],
+            "folderPath": folders[folder_refs[i]] if folder_refs[i] is not None else None,
+            "dateAdded": dates[i],
+            "deleted": bool(deleted[i])
+        }
+        for i in range(count)
+    ]
+
+def dumps(payload: Any, media_type: str) -> bytes:
+    if media_type == COLUMNAR_MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(body: bytes, media_type: str) -> Any:
+    if media_type == COLUMNAR_MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+def _encodings() -> List[str]:
+    """服务端支持的压缩算法，按优先级"""
+    return ["zstd", "gzip"] if zstandard else ["gzip"]
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+class BodyTooLarge(ValueError):
+    """请求体 (或解压后的内容) 超过上限"""
+
+# 流式解压时每次输出的最大字节数
+DECOMPRESS_CHUNK = 64 * 1024
+
+def _gunzip(body: bytes, max_size: int) -> bytes:
+    """流式 gunzip (支持多个 gzip 成员)，输出超过 max_size 立即停止，不会先解压出完整内容"""
+    out = bytearray()
+    data = body
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while data:
+            out += decompressor.decompress(data, DECOMPRESS_CHUNK)
+            if len(out) > max_size:
+                raise BodyTooLarge()
+            data = decompressor.unconsumed_tail
+        if not decompressor.eof:
+            raise ValueError("gzip 数据不完整")
+        data = decompressor.unused_data
+    return bytes(out)
+
+def _unzstd(body: bytes, max_size: int) -> bytes:
+    out = bytearray()
+    with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+        while True:
+            chunk = reader.read(DECOMPRESS_CHUNK)
+            if not chunk:
+                break
+            out += chunk
+            if len(out) > max_size:
+                raise BodyTooLarge()
+    return bytes(out)
+
+def decompress(body: bytes, encoding: str, max_size: Optional[int] = None) -> bytes:
+    """max_size 不为空时限制解压后的大小，超出抛出 BodyTooLarge (用于客户端请求体，防止解压炸弹)"""
+    if encoding == "zstd" and zstandard:
+        if max_size is None:
+            return zstandard.ZstdDecompressor().decompress(body)
+        return _unzstd(body, max_size)
+    if encoding == "gzip":
+        if max_size is None:
+            return gzip.decompress(body)
+        return _gunzip(body, max_size)
+    raise ValueError(f"不支持的 Content-Encoding: {encoding}")
+
+def pack_json(payload: Any) -> bytes:
+    """存入数据库的 JSON 负载 (异步同步任务、幂等请求结果)，gzip 压缩"""
+    return compress(dumps(payload, COLUMNAR_JSON), "gzip")
+
+def unpack_json(data: bytes) -> Any:
+    return loads(decompress(data, "gzip"), COLUMNAR_JSON)
+
+def _tokens(header: str) -> List[str]:
+    """解析 Accept 类请求头，忽略参数，去掉 q=0 的项"""
+    tokens = []
+    for part in header.split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        if any(p.replace(" ", "") in ("q=0", "q=0.0") for p in params):
+            continue
+        if value:
+            tokens.append(value.lower())
+    return tokens
+
+def negotiate(request: Request) -> Optional[str]:
+    """根据 Accept 选择紧凑格式，客户端未请求时返回 None (默认 JSON)"""
+    accepted = _tokens(request.headers.get("accept", ""))
+    for media_type in COLUMNAR_TYPES:
+        if media_type in accepted:
+            return media_type
+    return None
+
+def compact_response(request: Request, media_type: str, payload: Dict[str, Any]) -> Response:
+    """按 Accept-Encoding 压缩并返回紧凑格式响应"""
+    body = dumps(payload, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    
+    accepted = _tokens(request.headers.get("accept-encoding", ""))
+    for encoding in _encodings():
+        if encoding in accepted:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            break
+    
+    return Response(content=body, media_type=media_type, headers=headers)
+
+class CompactRequest(Request):
+    """
+    请求体为紧凑格式或带 Content-Encoding 时，先解码为普通 JSON 再交给 FastAPI 校验
+    这样路由仍然可以直接声明 pydantic 请求模型
+    """
+    def __init__(self, scope, receive):
+        headers = dict(scope["headers"])
+        self._source_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+        self._source_encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        
+        if self._encoded():
+            scope = dict(scope)
+            scope["headers"] = [
+                (key, value) for key, value in scope["headers"]
+                if key not in (b"content-type", b"content-encoding")
+            ] + [(b"content-type", b"application/json")]
+        super().__init__(scope, receive)
+    
+    def _encoded(self) -> bool:
+        """请求体是否为紧凑格式或压缩内容 (需要解码后才是普通 JSON)"""
+        return self._source_type in COLUMNAR_TYPES or self._source_encoding not in ("", "identity")
+    
+    async def _read_limited(self, limit: int) -> bytes:
+        """按块读取原始请求体，超过 limit 立即返回 413，不依赖 Content-Length"""
+        chunks = []
+        size = 0
+        async for chunk in self.stream():
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="请求体过大"
+                )
+            chunks.append(chunk)
+        return b"".join(chunks)
+    
+    async def body(self) -> bytes:
+        """
+        紧凑格式/压缩请求体: 原始内容不超过 MAX_REQUEST_BODY_BYTES，解码后不超过 MAX_DECODED_BODY_BYTES
+        普通 JSON 请求体本身就是解码后的内容，只受 MAX_DECODED_BODY_BYTES 限制
+        """
+        if not hasattr(self, "_body"):
+            if not self._encoded():
+                self._body = await self._read_limited(settings.MAX_DECODED_BODY_BYTES)
+                return self._body
+            
+            body = await self._read_limited(settings.MAX_REQUEST_BODY_BYTES)
+            try:
+                if self._source_encoding not in ("", "identity"):
+                    body = decompress(body, self._source_encoding, settings.MAX_DECODED_BODY_BYTES)
+                
+                if self._source_type in COLUMNAR_TYPES:
+                    data = loads(body, self._source_type)
+                    if isinstance(data, dict) and isinstance(data.get("bookmarks"), dict):
+                        data["bookmarks"] = decode_columns(data["bookmarks"])
+                    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                    if len(body) > settings.MAX_DECODED_BODY_BYTES:
+                        raise BodyTooLarge()
+            except BodyTooLarge:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="解码后的请求体过大"
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"请求体解码失败: {str(e)}"
+                )
+            self._body = body
+        return self._body
+
+class CompactRoute(APIRoute):
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+        
+        async def handler(request: Request) -> Response:
+            return await original_handler(CompactRequest(request.scope, request.receive))
+        
+        return handler
@@ -8,16 +8,86 @@ class Settings(BaseSettings):
     DB_USER: str = "bookmark_sync"
     DB_PASSWORD: str = "bookmark_sync_pass"
     DB_NAME: str = "bookmark_sync"
+    # 连接数规划: DB_POOL_SIZE + DB_MAX_OVERFLOW >= WORKER_THREADS + 2 * SYNC_WORKERS (任务 + 续租) + 1 (定时维护) + DB_STREAM_SLOTS
+    # 否则突发请求时多出的线程等待 DB_POOL_TIMEOUT 后以连接池超时失败；启动时检查并打印警告
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800  # 秒，需小于 MySQL wait_timeout
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_TIMEOUT: int = 10  # 等待空闲连接的秒数，超时返回错误而不是无限排队
     
     # JWT
     JWT_SECRET: str = "your-super-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_HOURS: int = 24 * 30  # 30 days
+    AUTH_CACHE_TTL: int = 30  # 用户身份缓存秒数，禁用用户最迟在此时间后生效
+    AUTH_CACHE_SIZE: int = 10000
+    
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # 修改后旧密码在下次登录时自动重新哈希
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt 线程数 (约等于可用 CPU 核数)
+    PASSWORD_HASH_QUEUE: int = 16  # 最多排队的 bcrypt 任务，超出返回 429
     
     # Admin
     ADMIN_EMAIL: str = "admin@example.com"
     ADMIN_PASSWORD: str = "admin123"
     
+    # Server
+    WORKER_THREADS: int = 20  # 执行同步路由 (数据库访问) 的线程池大小，每个线程最多占用一个数据库连接
+    DB_STREAM_SLOTS: int = 4  # 同时从数据库流式输出的响应数，每个占用一个连接 (不占用线程)，超出的排队等待
+    
+    # Request body (同步接口)
+    MAX_REQUEST_BODY_BYTES: int = 8 * 1024 * 1024  # 紧凑格式/压缩请求体解码前的上限
+    MAX_DECODED_BODY_BYTES: int = 64 * 1024 * 1024  # 解码后 (含普通 JSON 请求体) 的上限，约 30 万个书签
+    
+    # Sync
+    SYNC_CURSOR_MAX_AGE_DAYS: int = 30  # 超过此时长的游标视为过期，回退全量合并
+    TOMBSTONE_RETENTION_DAYS: int = 60  # 已删除书签 (墓碑) 保留天数，更早的游标同样视为过期
+    SYNC_WORKERS: int = 2  # 进程内异步同步工作线程数，0 表示由独立进程 (python sync_queue.py) 消费
+    SYNC_JOB_LEASE: int = 60  # 异步同步任务的租约秒数，执行期间定期续租，过期视为工作进程已退出，重新排队
+    SYNC_JOB_HEARTBEAT: int = 15  # 续租间隔秒数，应明显小于 SYNC_JOB_LEASE
+    SYNC_JOB_MAX_ATTEMPTS: int = 3
+    SYNC_JOB_RETENTION: int = 86400  # 已结束的异步同步任务 (含结果) 保留秒数
+    IDEMPOTENCY_KEY_TTL: int = 86400  # Idempotency-Key 及其响应保留秒数
+    IDEMPOTENCY_PENDING_TIMEOUT: int = 120  # 处理中的记录超过此秒数视为请求已中断，允许重试接管
+    SYNC_LOG_RETENTION_DAYS: int = 90  # 同步日志明细保留天数，更早的按用户按天压缩为汇总
+    
+    # Outbound HTTP (批量分析抓取网页、调用 AI 接口)
+    HTTP_MAX_CONNECTIONS: int = 100  # 抓取网页的连接池上限
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保留秒数
+    HTTP_MAX_PER_HOST: int = 4  # 同一站点的最大并发请求数
+    PAGE_FETCH_MAX_BYTES: int = 524288  # 每个网页最多读取的字节数 (解压后)
+    HTTP2: bool = True  # 需要安装 h2，未安装时使用 HTTP/1.1
+    AI_MAX_CONNECTIONS: int = 20  # AI 接口的连接池上限
+    
+    # Page cache (批量分析的网页提取结果，跨用户共享)
+    PAGE_CACHE_TTL: int = 86400  # 秒，未过期直接使用，过期后条件请求重新验证
+    PAGE_CACHE_MAX_AGE_DAYS: int = 30  # 超过此天数未验证的条目删除
+    PAGE_CACHE_MAX_ROWS: int = 100000
+    PAGE_CACHE_MEMORY_SIZE: int = 2000  # 进程内 LRU 条目数
+    
+    # AI suggestion cache (跨用户共享，键不含 API Key)
+    AI_CACHE_TTL: int = 86400
+    AI_CACHE_NEGATIVE_TTL: int = 60  # 回复格式错误的缓存秒数 (HTTP/网络错误不缓存)
+    AI_CACHE_SIZE: int = 20000
+    
+    # AI prompt batching (多个网页合并为一次请求)
+    AI_BATCH_TOKEN_BUDGET: int = 6000  # 每次请求的输入 token 预算 (估算值，含系统提示词)
+    AI_BATCH_MAX_ITEMS: int = 20
+    AI_BATCH_OUTPUT_TOKENS: int = 80  # 每个网页预留的输出 token
+    
+    # Admin stats
+    STATS_CACHE_TTL: int = 10  # 管理后台统计快照缓存秒数
+    
+    # Background jobs (间隔秒数，0 为禁用)
+    COUNTER_RECONCILE_INTERVAL: int = 3600  # 校正用户书签数/同步次数计数器
+    SYNC_LOG_COMPACT_INTERVAL: int = 3600  # 压缩超出保留期的同步日志
+    TOMBSTONE_GC_INTERVAL: int = 3600  # 清理超出保留期的已删除书签
+    PAGE_CACHE_EVICT_INTERVAL: int = 3600  # 淘汰过期/超出容量的网页缓存
+    IDEMPOTENCY_PURGE_INTERVAL: int = 3600  # 清理过期的 Idempotency-Key
+    SYNC_JOB_MAINTAIN_INTERVAL: int = 60  # 重新排队超时的异步同步任务、清理已结束的任务
+    
     @property
     def DATABASE_URL(self) -> str:
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
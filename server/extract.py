@@ -0,0 +1,187 @@
+# 网页信息提取: 边下载边用增量解析器 (html.parser) 解析，
+# 拿到 <head> 中的字段、第一个 h1 和足够的正文后立即停止读取，不构建整棵 DOM 树
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional
+
+# 正文预览长度
+TEXT_LIMIT = 500
+
+# 不计入正文的元素
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript'}
+
+# 可以出现在 <head> 中的元素，其他元素开始即表示 <head> 已结束 (省略 <body> 的页面)
+HEAD_TAGS = {'html', 'head', 'title', 'meta', 'link', 'base', 'script', 'style', 'noscript', 'template'}
+
+# 行内元素: 前后的文字直接相连 (foo<b>bar</b> → foobar)，其他元素的边界视为空白
+INLINE_TAGS = {
+    'a', 'abbr', 'b', 'bdi', 'bdo', 'cite', 'code', 'data', 'dfn', 'em', 'font', 'i', 'img', 'kbd',
+    'mark', 'q', 's', 'samp', 'small', 'span', 'strong', 'sub', 'sup', 'time', 'u', 'var', 'wbr'
+}
+
+# 在此字节数内查找 <meta charset>
+SNIFF_BYTES = 2048
+
+# 正文已足够时，最多再在前这么多字符内等待 h1；页面没有 h1 时不必读满 PAGE_FETCH_MAX_BYTES
+H1_SCAN_CHARS = 64 * 1024
+
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.I)
+
+def is_html(content_type: str) -> bool:
+    return content_type.split(';')[0].strip().lower() in HTML_TYPES
+
+def _decoder(content_type: str, head: bytes) -> codecs.IncrementalDecoder:
+    """编码优先取响应头 charset，其次 <meta charset>，默认 UTF-8；无法解码的字节替换"""
+    match = _HEADER_CHARSET.search(content_type or '')
+    candidates = [match.group(1) if match else None]
+    meta = _META_CHARSET.search(head[:SNIFF_BYTES])
+    candidates.append(meta.group(1).decode('ascii') if meta else None)
+    
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.getincrementaldecoder(name)(errors='replace')
+        except LookupError:
+            continue
+    return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+class PageExtractor(HTMLParser):
+    """增量提取 title、meta description/keywords、第一个 h1 与正文预览"""
+    
+    def __init__(self, text_limit: int = TEXT_LIMIT, h1_scan_chars: int = H1_SCAN_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.text_limit = text_limit
+        self.h1_scan_chars = h1_scan_chars
+        self.fed_chars = 0
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self.keywords: Optional[str] = None
+        self.h1: Optional[str] = None
+        self.body_started = False
+        self._title_parts: Optional[List[str]] = None
+        self._h1_parts: Optional[List[str]] = None
+        self._skip_depth = 0
+        self._words: List[str] = []
+        self._text_length = 0
+        # 下一段文字是否与上一个词相连 (中间只隔着行内元素的边界)
+        self._glue = False
+    
+    @property
+    def text_full(self) -> bool:
+        return self._text_length >= self.text_limit
+    
+    @property
+    def head_done(self) -> bool:
+        """<head> 已结束 (meta 不会再出现)，或 title 与 description 都已取得"""
+        return self.body_started or (self.title is not None and self.description is not None)
+    
+    @property
+    def done(self) -> bool:
+        """<head> 字段齐全、正文足够，且已有 h1 或已超过 h1 的查找范围"""
+        if not (self.head_done and self.text_full):
+            return False
+        return self.h1 is not None or self.fed_chars >= self.h1_scan_chars
+    
+    def feed(self, data: str):
+        self.fed_chars += len(data)
+        super().feed(data)
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'meta':
+            attrs = dict(attrs)
+            name = (attrs.get('name') or '').lower()
+            if name == 'description' and self.description is None:
+                self.description = (attrs.get('content') or '').strip()
+            elif name == 'keywords' and self.keywords is None:
+                self.keywords = (attrs.get('content') or '').strip()
+        elif tag == 'h1' and self.h1 is None:
+            self._h1_parts = []
+        elif tag == 'body' or tag not in HEAD_TAGS:
+            self.body_started = True
+        
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        if tag not in INLINE_TAGS:
+            self._glue = False
+    
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts).strip()
+            self._title_parts = None
+        elif tag == 'h1' and self._h1_parts is not None:
+            self.h1 = ''.join(self._h1_parts).strip()
+            self._h1_parts = None
+        elif tag == 'head':
+            self.body_started = True
+        
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag not in INLINE_TAGS:
+            self._glue = False
+    
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._h1_parts is not None:
+            self._h1_parts.append(data)
+        if self._skip_depth or self.text_full or not data:
+            return
+        words = data.split()
+        if words and self._glue and self._words and not data[0].isspace():
+            # 与上一段文字之间没有空白 (行内元素或分块边界)，接在上一个词后面
+            self._words[-1] += words[0]
+            self._text_length += len(words[0])
+            words = words[1:]
+        for word in words:
+            self._words.append(word)
+            self._text_length += len(word) + 1
+        self._glue = not data[-1].isspace()
+    
+    def result(self) -> Dict[str, str]:
+        return {
+            'title': self.title or '',
+            'description': self.description or '',
+            'keywords': self.keywords or '',
+            'h1': self.h1 or '',
+            'text': ' '.join(self._words)[:self.text_limit]
+        }
+
+async def extract_stream(chunks: AsyncIterator[bytes], content_type: str, max_bytes: int) -> Dict[str, str]:
+    """
+    逐块读取响应体并增量解析，所需字段齐全或读满 max_bytes 后停止
+    返回 title/description/keywords/h1/text
+    """
+    extractor = PageExtractor()
+    decoder = None
+    head = b''
+    received = 0
+    
+    async for chunk in chunks:
+        chunk = chunk[:max_bytes - received]
+        received += len(chunk)
+        if decoder is None:
+            # 先缓冲开头的字节用于识别 <meta charset>
+            head += chunk
+            if len(head) < SNIFF_BYTES and received < max_bytes:
+                continue
+            decoder = _decoder(content_type, head)
+            chunk = head
+        extractor.feed(decoder.decode(chunk))
+        if extractor.done or received >= max_bytes:
+            break
+    
+    if decoder is None:
+        decoder = _decoder(content_type, head)
+        extractor.feed(decoder.decode(head))
+    if received < max_bytes:
+        # 读到末尾时输出解码器中剩余的字节；截断时丢弃被切断的多字节字符
+        extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    return extractor.result()
@@ -0,0 +1,96 @@
+# 应用级共享 HTTP 客户端: 启动时创建、退出时关闭，批量分析的所有请求复用连接池，
+# 同一站点/AI 接口的后续请求不再重复 TCP/TLS 握手
+import asyncio
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from config import get_settings
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # HTTP/2 可选，未安装 h2 时只使用 HTTP/1.1
+    h2 = None
+
+settings = get_settings()
+
+_page_client: Optional[httpx.AsyncClient] = None
+_ai_client: Optional[httpx.AsyncClient] = None
+
+class HostLimiter:
+    """按主机限制并发请求数，避免一个批次里同一站点的大量 URL 占满连接池或触发对方限流"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        # 主机 → [信号量, 持有/等待者数]，无人使用时删除，字典大小与活跃主机数相关
+        self._slots: Dict[str, List] = {}
+    
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        try:
+            host = httpx.URL(url).host
+        except Exception:
+            host = ""
+        
+        entry = self._slots.get(host)
+        if entry is None:
+            entry = self._slots[host] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._slots.pop(host, None)
+
+host_limiter = HostLimiter(settings.HTTP_MAX_PER_HOST)
+
+class _RejectCookies(DefaultCookiePolicy):
+    """不保存也不发送任何 Cookie"""
+    
+    def set_ok(self, cookie, request):
+        return False
+    
+    def return_ok(self, cookie, request):
+        return False
+
+def _new_client(max_connections: int) -> httpx.AsyncClient:
+    # 客户端由所有用户共享: 不保存网页或 AI 网关返回的 Cookie，避免在其他用户、其他 API Key 的请求中带上
+    return httpx.AsyncClient(
+        cookies=CookieJar(policy=_RejectCookies()),
+        http2=settings.HTTP2 and h2 is not None,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+def page_client() -> httpx.AsyncClient:
+    """抓取网页用的客户端"""
+    global _page_client
+    if _page_client is None:
+        _page_client = _new_client(settings.HTTP_MAX_CONNECTIONS)
+    return _page_client
+
+def ai_client() -> httpx.AsyncClient:
+    """调用 AI 接口用的客户端，与网页抓取分开，慢站点不会占用 AI 请求的连接"""
+    global _ai_client
+    if _ai_client is None:
+        _ai_client = _new_client(settings.AI_MAX_CONNECTIONS)
+    return _ai_client
+
+def start():
+    page_client()
+    ai_client()
+
+async def close():
+    global _page_client, _ai_client
+    for client in (_page_client, _ai_client):
+        if client is not None:
+            await client.aclose()
+    _page_client = None
+    _ai_client = None
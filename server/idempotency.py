@@ -0,0 +1,103 @@
+# /api/sync 幂等重试: 客户端为每次同步生成 Idempotency-Key，超时后带同一个键重试
+# 已完成的请求直接返回保存的响应，不再重复合并；仍在处理中的请求返回 409
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from codec import pack_json, unpack_json
+from config import get_settings
+from models import IdempotencyKey
+import metrics
+
+settings = get_settings()
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 64
+
+def request_hash(payload: Dict[str, Any], run_async: bool) -> str:
+    """请求摘要: 同一个键只能用于内容相同的请求"""
+    raw = json.dumps([payload, run_async], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _filter(db: Session, user_id: int, key: str):
+    return db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.idempotency_key == key
+    )
+
+def begin(db: Session, user_id: int, key: str, digest: str) -> Optional[Dict[str, Any]]:
+    """
+    登记一个幂等请求，返回 None 表示由本次请求执行；
+    返回字典表示同一请求已完成，应直接返回保存的响应
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的 Idempotency-Key")
+    
+    now = datetime.utcnow()
+    inserted = db.execute(
+        mysql_insert(IdempotencyKey.__table__).prefix_with("IGNORE").values(
+            user_id=user_id, idempotency_key=key, request_hash=digest, created_at=now
+        )
+    ).rowcount
+    db.commit()
+    if inserted:
+        return None
+    
+    row = _filter(db, user_id, key).first()
+    if row is None or row.request_hash != digest:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key 已用于其它请求"
+        )
+    if row.response is not None:
+        metrics.inc("sync_idempotent_replays")
+        return unpack_json(row.response)
+    
+    # 处理中: 超时未完成的视为原请求已中断 (合并事务已回滚)，由本次请求接管
+    taken = _filter(db, user_id, key).filter(
+        IdempotencyKey.response.is_(None),
+        IdempotencyKey.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT)
+    ).update({IdempotencyKey.created_at: now}, synchronize_session=False)
+    db.commit()
+    if taken:
+        return None
+    
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="相同的同步请求正在处理")
+
+def complete(db: Session, user_id: int, key: str, response: Dict[str, Any]):
+    """保存响应，之后带同一个键的重试直接返回它"""
+    _filter(db, user_id, key).update(
+        {IdempotencyKey.response: pack_json(response)},
+        synchronize_session=False
+    )
+    db.commit()
+
+def abort(db: Session, user_id: int, key: str):
+    """请求失败 (合并已回滚)，删除登记，允许客户端重试"""
+    db.rollback()
+    _filter(db, user_id, key).filter(
+        IdempotencyKey.response.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def purge_expired(db: Session, batch_size: int = 1000) -> int:
+    """删除超过 IDEMPOTENCY_KEY_TTL 的记录"""
+    threshold = datetime.utcnow() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    purged = 0
+    while True:
+        # MySQL DELETE ... LIMIT: 每批短事务，不长时间持锁
+        deleted = db.execute(
+            text("DELETE FROM idempotency_keys WHERE created_at < :threshold LIMIT :limit"),
+            {"threshold": threshold, "limit": batch_size}
+        ).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < batch_size:
+            break
+    return purged
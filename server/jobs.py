@@ -0,0 +1,221 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from models import engine, SessionLocal, User, Bookmark, SyncLog, SyncLogDaily
+import idempotency
+import metrics
+import page_cache
+import sync_queue
+
+settings = get_settings()
+
+# 后台维护任务: 在各副本的事件循环中定时触发，实际工作在线程池中执行
+# 通过 MySQL 命名锁保证同一任务同一时刻只在一个副本上运行
+_tasks: List[asyncio.Task] = []
+
+def run_exclusive(name: str, fn: Callable[[Session], Optional[int]]) -> Optional[int]:
+    """获取命名锁后执行任务，锁被其它副本持有时跳过 (返回 None)"""
+    # 命名锁属于连接，使用独立连接持有，避免会话提交后连接归还连接池
+    with engine.connect() as conn:
+        lock_name = f"bookmark_sync_job_{name}"
+        if conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": lock_name}).scalar() != 1:
+            return None
+        try:
+            db = SessionLocal()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+
+def reconcile_user_counters(db: Session, batch_size: int = 500) -> int:
+    """
+    重新统计用户计数器，修正漂移，返回修正的用户数
+    按批锁定用户行 (FOR UPDATE) 后再统计: 同步事务对计数器做的是相对增量，
+    锁等待期间未提交的同步会在本批提交后再叠加，不会被覆盖
+    """
+    fixed = 0
+    last_id = 0
+    bookmark_bytes = func.coalesce(func.sum(
+        func.length(func.coalesce(Bookmark.url, "")) +
+        func.length(func.coalesce(Bookmark.title, "")) +
+        func.length(func.coalesce(Bookmark.folder_path, ""))
+    ), 0)
+    
+    while True:
+        users = db.query(
+            User.id, User.bookmark_count, User.bookmark_bytes, User.sync_count
+        ).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(batch_size).with_for_update().all()
+        if not users:
+            break
+        ids = [u.id for u in users]
+        last_id = ids[-1]
+        
+        bookmark_totals = {
+            row.user_id: row for row in db.query(
+                Bookmark.user_id,
+                func.count(Bookmark.id).label("bookmark_count"),
+                bookmark_bytes.label("bookmark_bytes")
+            ).filter(
+                Bookmark.user_id.in_(ids),
+                Bookmark.deleted_at.is_(None)
+            ).group_by(Bookmark.user_id)
+        }
+        # 同步次数 = 保留期内的日志明细 + 已压缩的每日汇总
+        sync_totals = dict(db.query(
+            SyncLog.user_id,
+            func.count(SyncLog.id)
+        ).filter(
+            SyncLog.user_id.in_(ids)
+        ).group_by(SyncLog.user_id).all())
+        for user_id, syncs in db.query(
+            SyncLogDaily.user_id,
+            func.sum(SyncLogDaily.syncs)
+        ).filter(
+            SyncLogDaily.user_id.in_(ids)
+        ).group_by(SyncLogDaily.user_id):
+            sync_totals[user_id] = sync_totals.get(user_id, 0) + int(syncs)
+        
+        for user in users:
+            totals = bookmark_totals.get(user.id)
+            values = {
+                User.bookmark_count: totals.bookmark_count if totals else 0,
+                User.bookmark_bytes: int(totals.bookmark_bytes) if totals else 0,
+                User.sync_count: sync_totals.get(user.id, 0)
+            }
+            if (user.bookmark_count, user.bookmark_bytes, user.sync_count) != tuple(values.values()):
+                db.query(User).filter(User.id == user.id).update(values, synchronize_session=False)
+                fixed += 1
+        
+        db.commit()
+    
+    metrics.inc("counter_reconcile_fixed", fixed)
+    return fixed
+
+def compact_sync_logs(db: Session, batch_size: int = 5000) -> int:
+    """
+    将超出保留期的同步日志按用户按天累加到 sync_log_daily 后删除明细，返回压缩的行数
+    截止时间取整到天，同一天的日志总是整体压缩；汇总与删除在同一事务中，
+    计数器校正看到的明细 + 汇总总数始终一致
+    """
+    cutoff = datetime.combine(
+        datetime.utcnow().date() - timedelta(days=settings.SYNC_LOG_RETENTION_DAYS),
+        datetime.min.time()
+    )
+    compacted = 0
+    
+    while True:
+        rows = db.query(
+            SyncLog.id, SyncLog.user_id, SyncLog.created_at,
+            SyncLog.added, SyncLog.updated, SyncLog.deleted, SyncLog.conflicts
+        ).filter(
+            SyncLog.created_at < cutoff
+        ).order_by(SyncLog.created_at).limit(batch_size).all()
+        if not rows:
+            break
+        
+        daily = {}
+        for row in rows:
+            key = (row.user_id, row.created_at.date())
+            totals = daily.setdefault(key, [0, 0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += row.added or 0
+            totals[2] += row.updated or 0
+            totals[3] += row.deleted or 0
+            totals[4] += row.conflicts or 0
+        
+        stmt = mysql_insert(SyncLogDaily.__table__)
+        stmt = stmt.on_duplicate_key_update({
+            name: SyncLogDaily.__table__.c[name] + stmt.inserted[name]
+            for name in ("syncs", "added", "updated", "deleted", "conflicts")
+        })
+        db.execute(stmt, [
+            {
+                "user_id": user_id, "day": day, "syncs": totals[0], "added": totals[1],
+                "updated": totals[2], "deleted": totals[3], "conflicts": totals[4]
+            }
+            for (user_id, day), totals in daily.items()
+        ])
+        db.query(SyncLog).filter(
+            SyncLog.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.commit()
+        compacted += len(rows)
+    
+    metrics.inc("sync_log_compacted_rows", compacted)
+    return compacted
+
+def collect_tombstones(db: Session, batch_size: int = 1000, pause: float = 0.1) -> int:
+    """
+    硬删除早于 TOMBSTONE_RETENTION_DAYS 的墓碑 (已软删除的书签)，返回清理的行数
+    小批量按主键删除并逐批提交，批次间短暂停顿，不长时间持有锁
+    sync.decode_cursor 把早于保留期的游标视为过期，被清理的删除记录不会漏发给增量同步
+    """
+    horizon = datetime.utcnow() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    reclaimed = 0
+    
+    while True:
+        ids = [row.id for row in db.query(Bookmark.id).filter(
+            Bookmark.deleted_at < horizon
+        ).order_by(Bookmark.deleted_at).limit(batch_size)]
+        if not ids:
+            break
+        
+        # 再次检查 deleted_at: 期间被同步恢复的书签不删除
+        deleted = db.query(Bookmark).filter(
+            Bookmark.id.in_(ids),
+            Bookmark.deleted_at < horizon
+        ).delete(synchronize_session=False)
+        db.commit()
+        reclaimed += deleted
+        metrics.inc("tombstones_reclaimed", deleted)
+        
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    
+    return reclaimed
+
+def _jobs() -> List[Tuple[str, int, Callable[[Session], Optional[int]]]]:
+    """(任务名, 间隔秒数, 任务函数)，间隔为 0 表示禁用"""
+    return [
+        ("reconcile_user_counters", settings.COUNTER_RECONCILE_INTERVAL, reconcile_user_counters),
+        ("compact_sync_logs", settings.SYNC_LOG_COMPACT_INTERVAL, compact_sync_logs),
+        ("collect_tombstones", settings.TOMBSTONE_GC_INTERVAL, collect_tombstones),
+        ("evict_page_cache", settings.PAGE_CACHE_EVICT_INTERVAL, page_cache.evict),
+        ("purge_idempotency_keys", settings.IDEMPOTENCY_PURGE_INTERVAL, idempotency.purge_expired),
+        ("sync_queue_maintain", settings.SYNC_JOB_MAINTAIN_INTERVAL, sync_queue.maintain),
+    ]
+
+async def _run_periodically(name: str, interval: int, fn: Callable[[Session], Optional[int]]):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await run_in_threadpool(run_exclusive, name, fn)
+            if result:
+                print(f"Job {name}: {result}")
+        except Exception as e:
+            metrics.inc(f"job_{name}_errors")
+            print(f"Job {name} failed: {e}")
+
+def start():
+    for name, interval, fn in _jobs():
+        if interval > 0:
+            _tasks.append(asyncio.create_task(_run_periodically(name, interval, fn)))
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,10 +1,16 @@
+import anyio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import get_settings
 from models import init_db, get_db, User
 from auth import hash_password
 from routers import user, bookmark, admin, analyze
+import http_client
+import jobs
+import metrics
+import sync_queue
 
 settings = get_settings()
 
@@ -29,11 +35,7 @@ app.include_router(bookmark.router)
 app.include_router(admin.router)
 app.include_router(analyze.router)
 
-@app.on_event("startup")
-async def startup():
-    # 初始化数据库
-    init_db()
-    
+def ensure_admin():
     # 创建默认管理员
     db = next(get_db())
     admin_user = db.query(User).filter(User.email == settings.ADMIN_EMAIL).first()
@@ -48,6 +50,41 @@ async def startup():
         print(f"Created admin user: {settings.ADMIN_EMAIL}")
     db.close()
 
+def check_pool_sizing():
+    """线程与流式响应可能同时占用的连接数超过连接池容量时打印警告 (规则见 config.py)"""
+    needed = settings.WORKER_THREADS + 2 * settings.SYNC_WORKERS + 1 + settings.DB_STREAM_SLOTS
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    if needed > capacity:
+        print(
+            f"Warning: up to {needed} concurrent DB connections (WORKER_THREADS + 2 * SYNC_WORKERS + 1 + DB_STREAM_SLOTS) "
+            f"but the pool allows {capacity} (DB_POOL_SIZE + DB_MAX_OVERFLOW); bursts may fail with pool timeouts"
+        )
+
+@app.on_event("startup")
+async def startup():
+    # 数据库访问是同步的，路由声明为 def 由线程池执行，不阻塞事件循环
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.WORKER_THREADS
+    check_pool_sizing()
+    
+    # 初始化数据库
+    await run_in_threadpool(init_db)
+    await run_in_threadpool(ensure_admin)
+    
+    # 定时维护任务
+    jobs.start()
+    
+    # 异步同步工作线程
+    sync_queue.start()
+    
+    # 批量分析共享的 HTTP 连接池
+    http_client.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await jobs.stop()
+    await run_in_threadpool(sync_queue.stop)
+    await http_client.close()
+
 @app.get("/")
 async def root():
     return {"message": "Bookmark Sync API", "version": "1.0.0"}
@@ -56,6 +93,11 @@ async def root():
 async def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def get_metrics():
+    # 仅集群内访问 (admin nginx 不代理此路径)
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
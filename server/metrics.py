@@ -0,0 +1,30 @@
+import threading
+from typing import Callable, Dict
+
+# 进程内指标: 计数器由各模块累加，仪表 (gauge) 在读取时回调取值
+# 由 /metrics 输出，用于按 MySQL max_connections 规划副本数和连接池大小
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+def inc(name: str, value: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def observe(name: str, value: float):
+    """记录一次观测值: name_count / name_sum / name_max"""
+    with _lock:
+        _counters[f"{name}_count"] = _counters.get(f"{name}_count", 0) + 1
+        _counters[f"{name}_sum"] = _counters.get(f"{name}_sum", 0) + value
+        if value > _counters.get(f"{name}_max", 0):
+            _counters[f"{name}_max"] = value
+
+def register_gauge(name: str, fn: Callable[[], float]):
+    _gauges[name] = fn
+
+def snapshot() -> Dict[str, float]:
+    with _lock:
+        values = dict(_counters)
+    for name, fn in _gauges.items():
+        values[name] = fn()
+    return values
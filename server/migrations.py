@@ -0,0 +1,117 @@
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# 每个用户的未删除书签数与字节数，口径与 sync.bookmark_size、jobs.reconcile_user_counters 一致
+BOOKMARK_TOTALS_SQL = """
+    SELECT user_id,
+           COUNT(*) AS bookmark_count,
+           SUM(LENGTH(COALESCE(url, '')) + LENGTH(COALESCE(title, '')) + LENGTH(COALESCE(folder_path, ''))) AS bookmark_bytes
+    FROM bookmarks
+    WHERE deleted_at IS NULL
+    GROUP BY user_id
+"""
+
+# 每个用户的同步次数 (同步日志明细，迁移 4 时尚无压缩汇总)
+SYNC_TOTALS_SQL = """
+    SELECT user_id, COUNT(*) AS sync_count
+    FROM sync_logs
+    GROUP BY user_id
+"""
+
+# 数据库迁移: create_all 只会建新表，不会修改已有表
+# 每项为 (版本号, 说明, SQL 列表)，按版本号顺序执行，只追加不修改
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "书签内容哈希与用户书签树摘要", [
+        "ALTER TABLE users ADD COLUMN tree_digest VARCHAR(64) NULL",
+        "ALTER TABLE bookmarks ADD COLUMN content_hash VARCHAR(64) NULL",
+        # 与 sync.bookmark_hash 相同: sha256(url \x1f title \x1f folder_path)
+        """UPDATE bookmarks SET content_hash = SHA2(CONCAT(
+            COALESCE(url, ''), CHAR(31 USING utf8mb4),
+            COALESCE(title, ''), CHAR(31 USING utf8mb4),
+            COALESCE(folder_path, '')), 256)""",
+    ]),
+    (2, "URL 哈希列、(user_id, deleted_at) 复合索引、(user_id, url_hash) 唯一索引", [
+        "ALTER TABLE bookmarks ADD COLUMN url_hash CHAR(40) NULL",
+        "UPDATE bookmarks SET url_hash = SHA1(url) WHERE url IS NOT NULL",
+        # 唯一索引前去重: 先删除已有存活行的墓碑，再保留每组 id 最大的一行
+        """DELETE t FROM bookmarks t
+            JOIN bookmarks l ON l.user_id = t.user_id AND l.url_hash = t.url_hash AND l.id <> t.id
+            WHERE t.deleted_at IS NOT NULL AND l.deleted_at IS NULL""",
+        """DELETE o FROM bookmarks o
+            JOIN bookmarks n ON n.user_id = o.user_id AND n.url_hash = o.url_hash AND n.id > o.id""",
+        # 去重会改变书签树，摘要置空，下次同步时重新计算
+        "UPDATE users SET tree_digest = NULL",
+        "CREATE INDEX ix_bookmarks_user_deleted ON bookmarks (user_id, deleted_at)",
+        "CREATE UNIQUE INDEX uq_bookmarks_user_url_hash ON bookmarks (user_id, url_hash)",
+    ]),
+    (3, "按修改时间分页的 (user_id, updated_at) 索引", [
+        "CREATE INDEX ix_bookmarks_user_updated ON bookmarks (user_id, updated_at)",
+    ]),
+    (4, "用户书签数/字节数/同步次数计数器", [
+        """ALTER TABLE users
+            ADD COLUMN bookmark_count INT NOT NULL DEFAULT 0,
+            ADD COLUMN bookmark_bytes BIGINT NOT NULL DEFAULT 0,
+            ADD COLUMN sync_count INT NOT NULL DEFAULT 0""",
+        f"""UPDATE users u JOIN ({BOOKMARK_TOTALS_SQL}) b ON b.user_id = u.id
+            SET u.bookmark_count = b.bookmark_count, u.bookmark_bytes = b.bookmark_bytes""",
+        f"""UPDATE users u JOIN ({SYNC_TOTALS_SQL}) s ON s.user_id = u.id
+            SET u.sync_count = s.sync_count""",
+    ]),
+    (5, "每日统计汇总表回填", [
+        # daily_stats 表由 create_all 创建，这里只从已有数据回填，分片口径与 stats.STATS_SHARDS 一致
+        """INSERT INTO daily_stats (day, shard, syncs, added, updated, deleted, registrations)
+            SELECT DATE(created_at), user_id % 16, COUNT(*),
+                   COALESCE(SUM(added), 0), COALESCE(SUM(updated), 0), COALESCE(SUM(deleted), 0), 0
+            FROM sync_logs
+            WHERE created_at IS NOT NULL
+            GROUP BY DATE(created_at), user_id % 16
+            ON DUPLICATE KEY UPDATE syncs = VALUES(syncs), added = VALUES(added),
+                updated = VALUES(updated), deleted = VALUES(deleted)""",
+        """INSERT INTO daily_stats (day, shard, registrations)
+            SELECT DATE(created_at), id % 16, COUNT(*)
+            FROM users
+            WHERE created_at IS NOT NULL
+            GROUP BY DATE(created_at), id % 16
+            ON DUPLICATE KEY UPDATE registrations = VALUES(registrations)""",
+    ]),
+    (6, "同步日志 (user_id, created_at)、(created_at) 索引", [
+        # sync_log_daily 表由 create_all 创建
+        "CREATE INDEX ix_sync_logs_user_created ON sync_logs (user_id, created_at)",
+        "CREATE INDEX ix_sync_logs_created ON sync_logs (created_at)",
+        # 复合索引以 user_id 开头，可替代外键所需的单列索引
+        "DROP INDEX ix_sync_logs_user_id ON sync_logs",
+    ]),
+    (7, "墓碑清理的 (deleted_at) 索引", [
+        "CREATE INDEX ix_bookmarks_deleted ON bookmarks (deleted_at)",
+    ]),
+]
+
+# 多副本同时启动时只允许一个执行迁移
+LOCK_NAME = "bookmark_sync_migrate"
+LOCK_TIMEOUT = 300
+
+def upgrade(engine: Engine, fresh: bool = False):
+    """执行未应用的迁移；fresh=True 表示表结构刚由 create_all 建成，只记录版本"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT})
+        try:
+            applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+            
+            for version, description, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                
+                if not fresh:
+                    print(f"Applying migration {version}: {description}")
+                    for statement in statements:
+                        conn.execute(text(statement))
+                
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, UTC_TIMESTAMP())"),
+                    {"v": version, "d": description}
+                )
+                conn.commit()
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+            conn.commit()
@@ -1,13 +1,54 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey
+from sqlalchemy import create_engine, event, exc, inspect, Column, Integer, BigInteger, String, CHAR, Boolean, Date, DateTime, Text, LargeBinary, Enum, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 import enum
+import time
 
 from config import get_settings
+import metrics
 
 settings = get_settings()
-engine = create_engine(settings.DATABASE_URL, echo=False)
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接的等待时间、溢出连接和超时次数"""
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow_before = self.overflow()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            metrics.inc("db_pool_timeouts")
+            raise
+        finally:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - start)
+        
+        # overflow() 从 -pool_size 起计，大于 0 才是超出 pool_size 的溢出连接
+        if self.overflow() > max(overflow_before, 0):
+            metrics.inc("db_pool_overflow_events")
+        return conn
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_timeout=settings.DB_POOL_TIMEOUT
+)
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    metrics.inc("db_pool_connects")
+
+# engine.pool 在 dispose 后会被替换，每次读取时取当前的池
+metrics.register_gauge("db_pool_size", lambda: engine.pool.size())
+metrics.register_gauge("db_pool_checked_out", lambda: engine.pool.checkedout())
+metrics.register_gauge("db_pool_checked_in", lambda: engine.pool.checkedin())
+metrics.register_gauge("db_pool_overflow", lambda: max(engine.pool.overflow(), 0))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -20,6 +61,12 @@ class SyncAction(str, enum.Enum):
     download = "download"
     merge = "merge"
 
+class SyncJobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -29,21 +76,39 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     status = Column(Enum(UserStatus), default=UserStatus.active)
     last_sync_at = Column(DateTime, nullable=True)
+    tree_digest = Column(String(64), nullable=True)  # 全部未删除书签 content_hash 的异或
+    # 反范式计数器，由 smart_merge 在同步事务中维护，jobs.reconcile_user_counters 定期校正
+    bookmark_count = Column(Integer, nullable=False, default=0, server_default="0")  # 未删除书签数
+    bookmark_bytes = Column(BigInteger, nullable=False, default=0, server_default="0")  # 未删除书签字节数
+    sync_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     
     bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete-orphan")
     sync_logs = relationship("SyncLog", back_populates="user", cascade="all, delete-orphan")
+    sync_log_daily = relationship("SyncLogDaily", cascade="all, delete-orphan")
 
 class Bookmark(Base):
     __tablename__ = "bookmarks"
+    __table_args__ = (
+        # 热点查询: user_id = ? AND deleted_at IS NULL
+        Index("ix_bookmarks_user_deleted", "user_id", "deleted_at"),
+        # 按修改时间的键集分页: (user_id, updated_at, id)
+        Index("ix_bookmarks_user_updated", "user_id", "updated_at"),
+        # 墓碑清理按删除时间扫描
+        Index("ix_bookmarks_deleted", "deleted_at"),
+        # URL 点查与数据库端 upsert (Text 列无法直接建唯一索引)
+        UniqueConstraint("user_id", "url_hash", name="uq_bookmarks_user_url_hash"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     chrome_id = Column(String(50), nullable=True)
     url = Column(Text, nullable=True)
+    url_hash = Column(CHAR(40), nullable=True)  # sha1(url)
     title = Column(String(500), nullable=True)
     parent_folder = Column(String(255), nullable=True)
     folder_path = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256(url, title, folder_path)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -54,7 +119,7 @@ class SyncLog(Base):
     __tablename__ = "sync_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     action = Column(Enum(SyncAction), nullable=False)
     added = Column(Integer, default=0)
     updated = Column(Integer, default=0)
@@ -63,6 +128,100 @@ class SyncLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="sync_logs")
+    
+    __table_args__ = (
+        # 管理后台最近同步记录
+        Index("ix_sync_logs_user_created", "user_id", "created_at"),
+        # 保留期压缩按时间扫描
+        Index("ix_sync_logs_created", "created_at"),
+    )
+
+class SyncLogDaily(Base):
+    """超出保留期的同步日志按用户按天压缩后的汇总，由 jobs.compact_sync_logs 写入"""
+    __tablename__ = "sync_log_daily"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+    syncs = Column(Integer, nullable=False, default=0, server_default="0")
+    added = Column(Integer, nullable=False, default=0, server_default="0")
+    updated = Column(Integer, nullable=False, default=0, server_default="0")
+    deleted = Column(Integer, nullable=False, default=0, server_default="0")
+    conflicts = Column(Integer, nullable=False, default=0, server_default="0")
+
+class DailyStat(Base):
+    """按天汇总的统计，在写入路径上增量累加，历史图表无需扫描 sync_logs"""
+    __tablename__ = "daily_stats"
+    
+    day = Column(Date, primary_key=True)
+    # 同一天的计数按 user_id 分散到多行，避免所有同步争用同一行锁，读取时求和
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    syncs = Column(Integer, nullable=False, default=0, server_default="0")
+    added = Column(Integer, nullable=False, default=0, server_default="0")
+    updated = Column(Integer, nullable=False, default=0, server_default="0")
+    deleted = Column(Integer, nullable=False, default=0, server_default="0")
+    registrations = Column(Integer, nullable=False, default=0, server_default="0")
+
+class SyncJob(Base):
+    """异步同步任务 (sync_queue)，请求体与结果以 gzip 压缩的 JSON 保存"""
+    __tablename__ = "sync_jobs"
+    __table_args__ = (
+        # 领取任务: status = 'queued' 按 id 顺序；同一用户只领取最早的未完成任务
+        Index("ix_sync_jobs_status", "status", "id"),
+        Index("ix_sync_jobs_user_status", "user_id", "status"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    public_id = Column(CHAR(32), unique=True, nullable=False)  # 返回给客户端的任务 ID，不可猜测
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(Enum(SyncJobStatus), nullable=False, default=SyncJobStatus.queued)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    payload = Column(LargeBinary(length=2**32 - 1), nullable=False)  # MySQL LONGBLOB
+    result = Column(LargeBinary(length=2**32 - 1), nullable=True)
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    lease_until = Column(DateTime, nullable=True)  # 执行中任务的租约到期时间，由工作线程定期续租
+    finished_at = Column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    """/api/sync 的 Idempotency-Key: 记录请求摘要与响应，客户端重试时直接返回已完成的结果"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_created", "created_at"),
+    )
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, autoincrement=False)
+    idempotency_key = Column(String(64), primary_key=True)
+    request_hash = Column(CHAR(64), nullable=False)
+    response = Column(LargeBinary(length=2**32 - 1), nullable=True)  # 为空表示请求仍在处理
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PageCache(Base):
+    """批量分析的网页提取结果缓存 (page_cache)，按规范化 URL 的 sha1 跨用户共享"""
+    __tablename__ = "page_cache"
+    __table_args__ = (
+        # 过期/容量淘汰按最近验证时间
+        Index("ix_page_cache_fetched", "fetched_at"),
+    )
+    
+    url_hash = Column(CHAR(40), primary_key=True)
+    url = Column(Text, nullable=False)
+    title = Column(Text, nullable=True)
+    description = Column(Text, nullable=True)
+    keywords = Column(Text, nullable=True)
+    h1 = Column(Text, nullable=True)
+    text = Column(Text, nullable=True)
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+    fetch_ms = Column(Integer, nullable=False, default=0)
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255), nullable=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
 
 def get_db():
     db = SessionLocal()
@@ -72,4 +231,9 @@ def get_db():
         db.close()
 
 def init_db():
+    from migrations import upgrade
+    
+    # 新库由 create_all 直接建成最新结构，只需记录版本；旧库执行未应用的迁移
+    fresh = not inspect(engine).has_table(User.__tablename__)
     Base.metadata.create_all(bind=engine)
+    upgrade(engine, fresh=fresh)
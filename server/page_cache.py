@@ -0,0 +1,213 @@
+# 网页抓取结果缓存: 批量分析中大量用户收藏相同的热门站点，按规范化 URL 共享提取结果
+# 进程内 LRU + page_cache 表；过期条目带 ETag/Last-Modified 条件请求重新验证，304 时直接续期
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from config import get_settings
+from models import SessionLocal, PageCache
+import metrics
+
+settings = get_settings()
+
+# 缓存的提取字段
+PAGE_FIELDS = ("title", "description", "keywords", "h1", "text")
+
+# 不影响页面内容的跟踪参数，规范化时去掉
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_memory = TTLCache(maxsize=settings.PAGE_CACHE_MEMORY_SIZE, ttl=settings.PAGE_CACHE_TTL)
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    规范化 URL 作为缓存键: 协议/主机小写、去掉默认端口、片段和跟踪参数、查询参数排序
+    非 http(s) 或带用户名密码的 URL 不缓存，返回 None
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname or parts.username or parts.password:
+        return None
+    
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+def cache_key(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+@dataclass
+class CachedPage:
+    page: Dict[str, Any]  # PAGE_FIELDS
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: datetime  # 最近一次抓取或验证的时间
+    fetch_ms: int  # 最近一次完整抓取的耗时，用于估算命中节省的时间
+    
+    @property
+    def fresh(self) -> bool:
+        return self.fetched_at > datetime.utcnow() - timedelta(seconds=settings.PAGE_CACHE_TTL)
+    
+    @property
+    def revalidatable(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+@dataclass
+class BatchCacheStats:
+    """单个批次的缓存统计，随分析结果返回"""
+    hits: int = 0
+    revalidated: int = 0  # 过期后条件请求返回 304
+    misses: int = 0
+    saved_ms: int = 0  # 命中 (含 304) 相对完整抓取节省的时间估算
+    
+    def record(self, outcome: str, saved_ms: int = 0):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        self.saved_ms += max(saved_ms, 0)
+        metrics.inc(f"page_cache_{outcome}")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hitRate": round((self.hits + self.revalidated) / total, 3) if total else 0.0,
+            "savedMs": self.saved_ms
+        }
+
+def _load(key: str) -> Optional[CachedPage]:
+    db = SessionLocal()
+    try:
+        row = db.get(PageCache, key)
+        if row is None:
+            return None
+        return CachedPage(
+            page={name: getattr(row, name) or "" for name in PAGE_FIELDS},
+            etag=row.etag,
+            last_modified=row.last_modified,
+            fetched_at=row.fetched_at,
+            fetch_ms=row.fetch_ms
+        )
+    finally:
+        db.close()
+
+def _save(key: str, url: str, entry: CachedPage):
+    db = SessionLocal()
+    try:
+        values = {
+            **{name: entry.page.get(name) or "" for name in PAGE_FIELDS},
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "fetched_at": entry.fetched_at,
+            "fetch_ms": entry.fetch_ms
+        }
+        stmt = mysql_insert(PageCache.__table__).values(url_hash=key, url=url, **values)
+        db.execute(stmt.on_duplicate_key_update(**values))
+        db.commit()
+    finally:
+        db.close()
+
+def _touch(key: str, fetched_at: datetime):
+    db = SessionLocal()
+    try:
+        db.query(PageCache).filter(PageCache.url_hash == key).update(
+            {PageCache.fetched_at: fetched_at},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+async def lookup(normalized: str) -> Optional[CachedPage]:
+    """先查进程内缓存，再查数据库 (可能已过期，由调用方决定是否重新验证)"""
+    key = cache_key(normalized)
+    entry = _memory.get(key)
+    if entry is not None:
+        return entry
+    
+    try:
+        entry = await run_in_threadpool(_load, key)
+    except Exception as e:
+        print(f"Page cache lookup failed: {e}")
+        return None
+    if entry is not None and entry.fresh:
+        _memory.set(key, entry)
+    return entry
+
+async def store(normalized: str, page: Dict[str, Any], etag: Optional[str], last_modified: Optional[str], fetch_ms: int):
+    """保存完整抓取的结果"""
+    key = cache_key(normalized)
+    entry = CachedPage(
+        page={name: page.get(name) or "" for name in PAGE_FIELDS},
+        etag=etag,
+        last_modified=last_modified,
+        fetched_at=datetime.utcnow().replace(microsecond=0),
+        fetch_ms=fetch_ms
+    )
+    _memory.set(key, entry)
+    try:
+        await run_in_threadpool(_save, key, normalized, entry)
+    except Exception as e:
+        # 缓存写入失败不影响分析结果
+        print(f"Page cache store failed: {e}")
+
+async def revalidated(normalized: str, entry: CachedPage):
+    """条件请求返回 304: 内容未变，续期"""
+    key = cache_key(normalized)
+    entry.fetched_at = datetime.utcnow().replace(microsecond=0)
+    _memory.set(key, entry)
+    try:
+        await run_in_threadpool(_touch, key, entry.fetched_at)
+    except Exception as e:
+        print(f"Page cache touch failed: {e}")
+
+def evict(db: Session, batch_size: int = 1000) -> int:
+    """
+    定时任务 (jobs.py): 删除超过 PAGE_CACHE_MAX_AGE_DAYS 未验证的条目，
+    总数仍超过 PAGE_CACHE_MAX_ROWS 时按最近验证时间从旧到新删除，返回删除的行数
+    """
+    threshold = datetime.utcnow() - timedelta(days=settings.PAGE_CACHE_MAX_AGE_DAYS)
+    evicted = 0
+    while True:
+        deleted = db.execute(
+            text("DELETE FROM page_cache WHERE fetched_at < :threshold ORDER BY fetched_at LIMIT :limit"),
+            {"threshold": threshold, "limit": batch_size}
+        ).rowcount
+        db.commit()
+        evicted += deleted
+        if deleted < batch_size:
+            break
+    
+    excess = db.execute(text("SELECT COUNT(*) FROM page_cache")).scalar() - settings.PAGE_CACHE_MAX_ROWS
+    while excess > 0:
+        deleted = db.execute(
+            text("DELETE FROM page_cache ORDER BY fetched_at LIMIT :limit"),
+            {"limit": min(excess, batch_size)}
+        ).rowcount
+        db.commit()
+        if not deleted:
+            break
+        evicted += deleted
+        excess -= deleted
+    
+    metrics.inc("page_cache_evicted", evicted)
+    return evicted
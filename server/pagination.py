@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import Bookmark
+
+# 键集分页 (keyset): 游标记录上一页最后一行的排序键，下一页用 WHERE 键 > 游标 走索引范围扫描
+# 不使用 OFFSET，翻到第几页代价都一样
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+def encode_page_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_page_cursor(cursor: str, types: Tuple[type, ...]) -> List[Any]:
+    """解析游标，types 为各排序键的类型 (int 不接受 bool)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        for value, expected in zip(values, types):
+            if isinstance(value, bool) or not isinstance(value, expected):
+                raise ValueError
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+def bookmark_page(
+    db: Session,
+    user_id: int,
+    columns: Tuple[Any, ...],
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    folder: Optional[str] = None,
+    since: Optional[datetime] = None,
+    descending: bool = False
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    分页读取书签，返回 (当前页行, 下一页游标)，没有下一页时游标为 None
+    - 默认: 未删除书签，按 id 排序 (ix_bookmarks_user_deleted 范围扫描)
+    - since: 该时间之后修改过的书签 (含墓碑)，按 (updated_at, id) 排序
+      (ix_bookmarks_user_updated 范围扫描)
+    - folder: 文件夹路径前缀
+    columns 必须包含 Bookmark.id，使用 since 时还需包含 Bookmark.updated_at
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(*columns).filter(Bookmark.user_id == user_id)
+    
+    if since is not None:
+        query = query.filter(Bookmark.updated_at >= since)
+        if cursor:
+            last_updated, last_id = decode_page_cursor(cursor, (str, int))
+            try:
+                last_updated = datetime.fromisoformat(last_updated)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="无效的分页游标"
+                )
+            query = query.filter(or_(
+                Bookmark.updated_at > last_updated,
+                and_(Bookmark.updated_at == last_updated, Bookmark.id > last_id)
+            ))
+        query = query.order_by(Bookmark.updated_at, Bookmark.id)
+    else:
+        query = query.filter(Bookmark.deleted_at.is_(None))
+        if cursor:
+            last_id, = decode_page_cursor(cursor, (int,))
+            query = query.filter(Bookmark.id < last_id if descending else Bookmark.id > last_id)
+        query = query.order_by(Bookmark.id.desc() if descending else Bookmark.id)
+    
+    if folder:
+        query = query.filter(Bookmark.folder_path.startswith(folder, autoescape=True))
+    
+    # 多取一行判断是否还有下一页
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    last = rows[-1]
+    if since is not None:
+        next_cursor = encode_page_cursor([last.updated_at.isoformat(), last.id])
+    else:
+        next_cursor = encode_page_cursor([last.id])
+    return rows, next_cursor
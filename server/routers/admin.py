@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
 
 from models import User, Bookmark, SyncLog, UserStatus, get_db
-from auth import get_admin_user, hash_password, create_token, verify_password
+from auth import (
+    CurrentUser, get_admin_user, hash_password, create_token, verify_password,
+    needs_rehash, invalidate_user
+)
+from pagination import bookmark_page, MAX_PAGE_SIZE
+import stats
+
+# 管理后台书签分页默认大小
+ADMIN_PAGE_SIZE = 100
+ADMIN_BOOKMARK_COLUMNS = (
+    Bookmark.id,
+    Bookmark.url,
+    Bookmark.title,
+    Bookmark.folder_path,
+    Bookmark.created_at
+)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -26,6 +40,14 @@ class StatsResponse(BaseModel):
     total_syncs: int
     today_syncs: int
 
+class DailyStatItem(BaseModel):
+    day: str
+    syncs: int
+    added: int
+    updated: int
+    deleted: int
+    registrations: int
+
 class UserListItem(BaseModel):
     id: int
     email: str
@@ -35,24 +57,45 @@ class UserListItem(BaseModel):
     last_sync_at: Optional[str]
     created_at: str
 
+class UserListResponse(BaseModel):
+    items: List[UserListItem]
+    total: int
+    page: int
+    page_size: int
+
 class UserDetailResponse(BaseModel):
     id: int
     email: str
     status: str
     is_admin: bool
     bookmark_count: int
+    bookmark_bytes: int
     sync_count: int
     last_sync_at: Optional[str]
     created_at: str
     bookmarks: List[dict]
+    bookmarks_next_cursor: Optional[str] = None
     recent_syncs: List[dict]
 
+class BookmarkPageResponse(BaseModel):
+    bookmarks: List[dict]
+    next_cursor: Optional[str] = None
+
 class UpdateUserRequest(BaseModel):
     status: Optional[str] = None
     is_admin: Optional[bool] = None
 
+def _admin_bookmark(bm) -> dict:
+    return {
+        "id": bm.id,
+        "url": bm.url,
+        "title": bm.title,
+        "folderPath": bm.folder_path,
+        "created_at": bm.created_at.isoformat()
+    }
+
 @router.post("/login", response_model=AdminLoginResponse)
-async def admin_login(req: AdminLoginRequest, db: Session = Depends(get_db)):
+def admin_login(req: AdminLoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == req.email).first()
     
     if not user or not verify_password(req.password, user.password_hash):
@@ -67,74 +110,100 @@ async def admin_login(req: AdminLoginRequest, db: Session = Depends(get_db)):
             detail="需要管理员权限"
         )
     
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(req.password)
+        db.commit()
+    
     token = create_token(user.id, user.email, user.is_admin)
     return AdminLoginResponse(token=token, email=user.email)
 
 @router.get("/stats", response_model=StatsResponse)
-async def get_stats(
-    admin: User = Depends(get_admin_user),
+def get_stats(
+    admin: CurrentUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.status == UserStatus.active).count()
-    disabled_users = db.query(User).filter(User.status == UserStatus.disabled).count()
-    total_bookmarks = db.query(Bookmark).filter(Bookmark.deleted_at.is_(None)).count()
-    total_syncs = db.query(SyncLog).count()
-    
-    today = datetime.utcnow().date()
-    today_syncs = db.query(SyncLog).filter(
-        func.date(SyncLog.created_at) == today
-    ).count()
-    
-    return StatsResponse(
-        total_users=total_users,
-        active_users=active_users,
-        disabled_users=disabled_users,
-        total_bookmarks=total_bookmarks,
-        total_syncs=total_syncs,
-        today_syncs=today_syncs
-    )
+    return StatsResponse(**stats.get_snapshot(db))
 
-@router.get("/users", response_model=List[UserListItem])
-async def list_users(
-    admin: User = Depends(get_admin_user),
+@router.get("/stats/daily", response_model=List[DailyStatItem])
+def get_daily_stats(
+    days: int = Query(30, ge=1, le=365),
+    admin: CurrentUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    users = db.query(User).order_by(User.created_at.desc()).all()
+    return [DailyStatItem(**item) for item in stats.daily_series(db, days)]
+
+@router.get("/users", response_model=UserListResponse)
+def list_users(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    sort: str = Query("created_at", pattern="^(created_at|last_sync_at|bookmark_count)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    q: Optional[str] = None,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """用户列表: 书签数读取用户计数器，支持分页、排序和邮箱搜索"""
+    query = db.query(
+        User.id,
+        User.email,
+        User.status,
+        User.is_admin,
+        User.last_sync_at,
+        User.created_at,
+        User.bookmark_count
+    )
     
-    result = []
-    for user in users:
-        bookmark_count = db.query(Bookmark).filter(
-            Bookmark.user_id == user.id,
-            Bookmark.deleted_at.is_(None)
-        ).count()
-        
-        result.append(UserListItem(
-            id=user.id,
-            email=user.email,
-            status=user.status.value,
-            is_admin=user.is_admin,
-            bookmark_count=bookmark_count,
-            last_sync_at=user.last_sync_at.isoformat() if user.last_sync_at else None,
-            created_at=user.created_at.isoformat()
-        ))
+    total_query = db.query(func.count(User.id))
+    if q:
+        search = User.email.contains(q, autoescape=True)
+        query = query.filter(search)
+        total_query = total_query.filter(search)
     
-    return result
+    sort_column = {
+        "created_at": User.created_at,
+        "last_sync_at": User.last_sync_at,
+        "bookmark_count": User.bookmark_count
+    }[sort]
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), User.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), User.id.asc())
+    
+    rows = query.offset((page - 1) * page_size).limit(page_size).all()
+    
+    return UserListResponse(
+        items=[
+            UserListItem(
+                id=row.id,
+                email=row.email,
+                status=row.status.value,
+                is_admin=row.is_admin,
+                bookmark_count=row.bookmark_count,
+                last_sync_at=row.last_sync_at.isoformat() if row.last_sync_at else None,
+                created_at=row.created_at.isoformat()
+            )
+            for row in rows
+        ],
+        total=total_query.scalar(),
+        page=page,
+        page_size=page_size
+    )
 
 @router.get("/user/{user_id}", response_model=UserDetailResponse)
-async def get_user(
+def get_user(
     user_id: int,
-    admin: User = Depends(get_admin_user),
+    admin: CurrentUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
     
-    bookmarks = db.query(Bookmark).filter(
-        Bookmark.user_id == user_id,
-        Bookmark.deleted_at.is_(None)
-    ).order_by(Bookmark.created_at.desc()).limit(100).all()
+    # 只返回第一页 (最新在前)，其余通过 /admin/user/{id}/bookmarks 按游标加载
+    bookmarks, next_cursor = bookmark_page(
+        db, user_id, ADMIN_BOOKMARK_COLUMNS,
+        limit=ADMIN_PAGE_SIZE, descending=True
+    )
     
     syncs = db.query(SyncLog).filter(
         SyncLog.user_id == user_id
@@ -145,20 +214,13 @@ async def get_user(
         email=user.email,
         status=user.status.value,
         is_admin=user.is_admin,
-        bookmark_count=len(bookmarks),
-        sync_count=len(syncs),
+        bookmark_count=user.bookmark_count,
+        bookmark_bytes=user.bookmark_bytes,
+        sync_count=user.sync_count,
         last_sync_at=user.last_sync_at.isoformat() if user.last_sync_at else None,
         created_at=user.created_at.isoformat(),
-        bookmarks=[
-            {
-                "id": bm.id,
-                "url": bm.url,
-                "title": bm.title,
-                "folderPath": bm.folder_path,
-                "created_at": bm.created_at.isoformat()
-            }
-            for bm in bookmarks
-        ],
+        bookmarks=[_admin_bookmark(bm) for bm in bookmarks],
+        bookmarks_next_cursor=next_cursor,
         recent_syncs=[
             {
                 "id": s.id,
@@ -172,11 +234,30 @@ async def get_user(
         ]
     )
 
+@router.get("/user/{user_id}/bookmarks", response_model=BookmarkPageResponse)
+def get_user_bookmarks(
+    user_id: int,
+    limit: int = Query(ADMIN_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    folder: Optional[str] = None,
+    admin: CurrentUser = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """用户书签分页 (最新在前)，folder 为文件夹路径前缀"""
+    bookmarks, next_cursor = bookmark_page(
+        db, user_id, ADMIN_BOOKMARK_COLUMNS,
+        limit=limit, cursor=cursor, folder=folder, descending=True
+    )
+    return BookmarkPageResponse(
+        bookmarks=[_admin_bookmark(bm) for bm in bookmarks],
+        next_cursor=next_cursor
+    )
+
 @router.put("/user/{user_id}")
-async def update_user(
+def update_user(
     user_id: int,
     req: UpdateUserRequest,
-    admin: User = Depends(get_admin_user),
+    admin: CurrentUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -189,12 +270,14 @@ async def update_user(
         user.is_admin = req.is_admin
     
     db.commit()
+    invalidate_user(user_id)
+    stats.invalidate_snapshot()
     return {"success": True}
 
 @router.delete("/user/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
-    admin: User = Depends(get_admin_user),
+    admin: CurrentUser = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
@@ -206,4 +289,6 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    invalidate_user(user_id)
+    stats.invalidate_snapshot()
     return {"success": True}
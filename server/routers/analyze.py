@@ -1,19 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import httpx
 import asyncio
-from bs4 import BeautifulSoup
+import hashlib
+import time
 import json
 
 from models import User, get_db
-from auth import get_current_user
+from auth import CurrentUser, get_current_user
 from config import get_settings
+from cache import TTLCache, SingleFlight
+import extract
+import http_client
+import metrics
+import page_cache
 
 settings = get_settings()
 router = APIRouter(prefix="/api", tags=["analyze"])
 
+# batch-analyze 流式输出格式
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+STREAM_PATTERN = '^(ndjson|sse)$'
+
+# AI 建议缓存与相同请求合并
+_ai_cache = TTLCache(maxsize=settings.AI_CACHE_SIZE, ttl=settings.AI_CACHE_TTL)
+_ai_flight = SingleFlight()
+
+# 模型对网页的回复无法解析: 与调用者的 Key/模型/接口配置无关，唯一可以短时间缓存的失败
+FORMAT_ERROR = 'AI 返回格式错误'
+
 class ApiConfig(BaseModel):
     apiUrl: str
     apiKey: str
@@ -24,6 +45,7 @@ class AnalyzeRequest(BaseModel):
     existingCategories: List[str] = []
     renameMode: str = "normal"  # normal, aggressive, conservative
     apiConfig: ApiConfig  # 从扩展传递的 API 配置
+    batchPrompts: bool = False  # True 时多个网页合并为一次 AI 请求 (按 token 预算分组)，默认逐个请求
 
 class AnalyzeResult(BaseModel):
     url: str
@@ -39,55 +61,56 @@ class AnalyzeResponse(BaseModel):
     success: int
     failed: int
     results: List[AnalyzeResult]
+    cache: Optional[Dict[str, Any]] = None  # 网页缓存统计: hits/revalidated/misses/hitRate/savedMs
 
 # 抓取单个网页
-async def fetch_page(client: httpx.AsyncClient, url: str) -> dict:
-    """抓取网页内容，返回提取的信息"""
+async def fetch_page(client: httpx.AsyncClient, url: str, cached: Optional[page_cache.CachedPage] = None) -> dict:
+    """
+    抓取网页内容，返回提取的信息
+    cached 不为空时发送条件请求，内容未变 (304) 返回 {'url': url, 'notModified': True}
+    """
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+    }
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+    
     try:
-        response = await client.get(
-            url,
-            follow_redirects=True,
-            timeout=10.0,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            }
-        )
-        
-        if response.status_code != 200:
-            return {'url': url, 'error': f'HTTP {response.status_code}'}
-        
-        html = response.text
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # 提取信息
-        title = soup.title.string.strip() if soup.title and soup.title.string else ''
-        
-        desc_tag = soup.find('meta', attrs={'name': 'description'})
-        description = desc_tag.get('content', '').strip() if desc_tag else ''
-        
-        keywords_tag = soup.find('meta', attrs={'name': 'keywords'})
-        keywords = keywords_tag.get('content', '').strip() if keywords_tag else ''
-        
-        h1_tag = soup.find('h1')
-        h1 = h1_tag.get_text().strip() if h1_tag else ''
-        
-        # 提取正文
-        for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript']):
-            tag.decompose()
-        
-        text = ' '.join(soup.get_text().split())[:500]
+        # 流式读取响应体，提取到所需字段或达到 PAGE_FETCH_MAX_BYTES 后不再读取剩余内容
+        async with http_client.host_limiter.slot(url):
+            async with client.stream(
+                'GET',
+                url,
+                follow_redirects=True,
+                timeout=10.0,
+                headers=headers
+            ) as response:
+                if response.status_code == 304 and cached is not None:
+                    return {'url': url, 'notModified': True}
+                
+                if response.status_code != 200:
+                    return {'url': url, 'error': f'HTTP {response.status_code}'}
+                
+                # 非 HTML (PDF、图片、下载文件等) 不读取响应体
+                content_type = response.headers.get('content-type', '')
+                if content_type and not extract.is_html(content_type):
+                    return {'url': url, 'error': f'非 HTML 内容: {content_type.split(";")[0].strip()}'}
+                
+                page = await extract.extract_stream(
+                    response.aiter_bytes(), content_type, settings.PAGE_FETCH_MAX_BYTES
+                )
         
         return {
             'url': url,
-            'title': title,
-            'description': description,
-            'keywords': keywords,
-            'h1': h1,
-            'text': text,
+            **page,
+            'etag': response.headers.get('etag'),
+            'lastModified': response.headers.get('last-modified'),
             'success': True
         }
         
@@ -98,19 +121,52 @@ async def fetch_page(client: httpx.AsyncClient, url: str) -> dict:
     except Exception as e:
         return {'url': url, 'error': str(e)}
 
-# 调用 AI 分析
-async def analyze_with_ai(
-    client: httpx.AsyncClient,
-    page_content: dict,
-    existing_categories: List[str],
-    rename_mode: str,
-    api_config: ApiConfig
-) -> dict:
-    """使用 AI 分析网页内容，生成建议"""
+# 带缓存的网页抓取
+async def fetch_page_cached(client: httpx.AsyncClient, url: str, stats: page_cache.BatchCacheStats) -> dict:
+    """
+    先查共享的网页缓存: 未过期直接使用；过期且有 ETag/Last-Modified 时条件请求，304 则续期；
+    否则完整抓取并写入缓存
+    """
+    normalized = page_cache.normalize_url(url)
+    if normalized is None:
+        return await fetch_page(client, url)
+    
+    cached = await page_cache.lookup(normalized)
+    if cached is not None and cached.fresh:
+        stats.record('hits', cached.fetch_ms)
+        return {'url': url, **cached.page, 'success': True}
+    
+    validator = cached if cached is not None and cached.revalidatable else None
+    started = time.perf_counter()
+    page_content = await fetch_page(client, url, validator)
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+    
+    if page_content.get('notModified'):
+        await page_cache.revalidated(normalized, validator)
+        stats.record('revalidated', validator.fetch_ms - elapsed_ms)
+        return {'url': url, **validator.page, 'success': True}
     
+    stats.record('misses')
+    if page_content.get('success'):
+        await page_cache.store(
+            normalized, page_content,
+            page_content.get('etag'), page_content.get('lastModified'), elapsed_ms
+        )
+    return page_content
+
+# 构造 AI 提示词
+# 单个网页的输出格式
+SINGLE_OUTPUT = '严格JSON: {"name": "书签名称", "category": "分类名", "isNew": false}'
+# 多个网页合并请求的输出格式，i 为输入中的序号
+BATCH_OUTPUT = (
+    '严格JSON数组，每个网页一项，按序号对应，不要遗漏: '
+    '[{"i": 序号, "name": "书签名称", "category": "分类名", "isNew": false}]'
+)
+
+def build_system_prompt(existing_categories: List[str], output: str = SINGLE_OUTPUT) -> str:
     folder_names = ', '.join(existing_categories) if existing_categories else '无'
     
-    system_prompt = f"""你是书签整理专家。分析网页信息，生成有意义的书签名称和分类。
+    return f"""你是书签整理专家。分析网页信息，生成有意义的书签名称和分类。
 
 用户已有分类: {folder_names}
 
@@ -125,8 +181,12 @@ async def analyze_with_ai(
 优先匹配已有分类；无合适则建议新分类
 
 ## 输出
-严格JSON: {{"name": "书签名称", "category": "分类名", "isNew": false}}"""
+{output}"""
 
+def build_prompts(page_content: dict, existing_categories: List[str]) -> Tuple[str, str]:
+    """返回 (system_prompt, user_content)"""
+    system_prompt = build_system_prompt(existing_categories)
+    
     user_content = f"""URL: {page_content.get('url', '')}
 网页标题: {page_content.get('title', '')}
 描述: {page_content.get('description', '')}
@@ -134,6 +194,35 @@ async def analyze_with_ai(
 H1: {page_content.get('h1', '')}
 内容预览: {page_content.get('text', '')}"""
 
+    return system_prompt, user_content
+
+def shareable(result: dict) -> bool:
+    """
+    结果能否缓存并共享给其他用户: 成功结果，或回复格式错误
+    HTTP 错误 (认证/额度/限流、模型不存在、请求参数错误等) 与网络错误取决于调用者的配置，只返回给调用者本人
+    """
+    return 'error' not in result or result['error'] == FORMAT_ERROR
+
+def ai_cache_key(user_content: str, existing_categories: List[str], rename_mode: str, api_config: ApiConfig) -> str:
+    """AI 建议缓存键: (网页内容摘要, 分类集合, 命名模式, 接口, 模型)，不含 API Key，跨用户共享"""
+    raw = json.dumps([
+        hashlib.sha256(user_content.encode('utf-8')).hexdigest(),
+        sorted(set(existing_categories)),
+        rename_mode,
+        api_config.apiUrl,
+        api_config.apiModel
+    ], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+# 请求 AI 接口
+async def chat_completion(
+    client: httpx.AsyncClient,
+    system_prompt: str,
+    user_content: str,
+    api_config: ApiConfig,
+    max_tokens: int = 150
+) -> dict:
+    """发送一次 chat-completion 请求，返回 {'content': ...} 或 {'error': ..., 'status': HTTP 状态码}"""
     try:
         response = await client.post(
             api_config.apiUrl,
@@ -148,81 +237,338 @@ H1: {page_content.get('h1', '')}
                     {'role': 'user', 'content': user_content}
                 ],
                 'temperature': 0.3,
-                'max_tokens': 150
+                'max_tokens': max_tokens
             },
             timeout=30.0
         )
         
         if response.status_code != 200:
-            return {'error': f'AI API 错误: {response.status_code}'}
+            return {'error': f'AI API 错误: {response.status_code}', 'status': response.status_code}
         
         data = response.json()
-        content = data['choices'][0]['message']['content']
+        return {'content': data['choices'][0]['message']['content']}
         
+    except Exception as e:
+        return {'error': f'AI 分析失败: {str(e)}'}
+
+def parse_suggestion(result: Any) -> Optional[dict]:
+    """AI 返回的单项 {"name", "category", "isNew"} → 建议字段，格式不对返回 None"""
+    if not isinstance(result, dict):
+        return None
+    return {
+        'suggestedName': result.get('name', ''),
+        'suggestedCategory': result.get('category', ''),
+        'isNewCategory': result.get('isNew', False)
+    }
+
+async def request_ai(
+    client: httpx.AsyncClient,
+    system_prompt: str,
+    user_content: str,
+    api_config: ApiConfig
+) -> dict:
+    """单个网页的 AI 建议，失败时返回 {'error': ..., 'status': HTTP 状态码}"""
+    reply = await chat_completion(client, system_prompt, user_content, api_config)
+    if 'error' in reply:
+        return reply
+    content = reply['content']
+    
+    try:
         # 解析 JSON
         start = content.find('{')
         end = content.rfind('}') + 1
         if start >= 0 and end > start:
-            result = json.loads(content[start:end])
-            return {
-                'suggestedName': result.get('name', ''),
-                'suggestedCategory': result.get('category', ''),
-                'isNewCategory': result.get('isNew', False)
-            }
-        
-        return {'error': 'AI 返回格式错误'}
-        
-    except Exception as e:
-        return {'error': f'AI 分析失败: {str(e)}'}
+            suggestion = parse_suggestion(json.loads(content[start:end]))
+            if suggestion:
+                return suggestion
+    except ValueError:
+        pass
+    
+    return {'error': FORMAT_ERROR}
+
+# 调用 AI 分析
+async def analyze_with_ai(
+    client: httpx.AsyncClient,
+    page_content: dict,
+    existing_categories: List[str],
+    rename_mode: str,
+    api_config: ApiConfig
+) -> dict:
+    """
+    使用 AI 分析网页内容，生成建议
+    结果按 ai_cache_key 跨用户缓存，格式错误短时间缓存，其他失败不缓存 (见 shareable)；
+    相同键的并发请求只向上游发送一次 (single-flight)
+    """
+    system_prompt, user_content = build_prompts(page_content, existing_categories)
+    key = ai_cache_key(user_content, existing_categories, rename_mode, api_config)
+    
+    cached = _ai_cache.get(key)
+    if cached is not None:
+        metrics.inc('ai_cache_hits')
+        return cached
+    metrics.inc('ai_cache_misses')
+    
+    def request():
+        return request_ai(client, system_prompt, user_content, api_config)
+    
+    result, shared = await _ai_flight.do(key, request)
+    if shared:
+        metrics.inc('ai_singleflight_shared')
+        # 共享的请求使用的是其他用户的 API Key，与配置相关的错误需要用自己的配置重试
+        if not shareable(result):
+            result = await request()
+        return result
+    
+    if 'error' not in result:
+        _ai_cache.set(key, result)
+    elif shareable(result):
+        _ai_cache.set(key, result, ttl=settings.AI_CACHE_NEGATIVE_TTL)
+    return result
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数: 非 ASCII 字符 (中文等) 约 1 token/字，ASCII 约 4 字符/token"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return len(text) - ascii_chars + ascii_chars // 4 + 1
+
+def pack_batches(items: List[Tuple[int, str]], base_tokens: int) -> List[List[Tuple[int, str]]]:
+    """
+    按 token 预算把 (序号, user_content) 分组，每组合并为一次请求
+    每组的输入 (含系统提示词) 不超过 AI_BATCH_TOKEN_BUDGET，条数不超过 AI_BATCH_MAX_ITEMS
+    """
+    batches: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    used = base_tokens
+    for item in items:
+        cost = estimate_tokens(item[1]) + settings.AI_BATCH_OUTPUT_TOKENS
+        if current and (used + cost > settings.AI_BATCH_TOKEN_BUDGET or len(current) >= settings.AI_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, used = [], base_tokens
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+async def request_ai_batch(
+    client: httpx.AsyncClient,
+    system_prompt: str,
+    batch: List[Tuple[int, str]],
+    api_config: ApiConfig
+) -> Dict[int, dict]:
+    """
+    多个网页合并为一次请求，返回 {序号: 建议}；缺失或格式不对的项不在结果中 (由调用方单个重试)
+    请求本身失败 (认证/额度/限流/网络错误等) 时每一项都返回该错误，逐个重试只会以同样的方式失败
+    """
+    user_content = '\n\n'.join(f'### 序号 {i}\n{content}' for i, content in batch)
+    reply = await chat_completion(
+        client, system_prompt, user_content, api_config,
+        max_tokens=settings.AI_BATCH_OUTPUT_TOKENS * len(batch)
+    )
+    metrics.inc('ai_batch_requests')
+    if 'error' in reply:
+        metrics.inc('ai_batch_errors')
+        return {i: reply for i, _ in batch}
+    content = reply['content']
+    
+    start = content.find('[')
+    end = content.rfind(']') + 1
+    if start < 0 or end <= start:
+        return {}
+    try:
+        items = json.loads(content[start:end])
+    except ValueError:
+        return {}
+    
+    expected = {i for i, _ in batch}
+    results: Dict[int, dict] = {}
+    for item in items if isinstance(items, list) else []:
+        suggestion = parse_suggestion(item)
+        if suggestion is None or not suggestion['suggestedName']:
+            continue
+        try:
+            i = int(item.get('i'))
+        except (TypeError, ValueError):
+            continue
+        if i in expected:
+            results[i] = suggestion
+    return results
+
+async def analyze_batch_with_ai(
+    client: httpx.AsyncClient,
+    pages: List[dict],
+    existing_categories: List[str],
+    rename_mode: str,
+    api_config: ApiConfig,
+    semaphore: asyncio.Semaphore
+) -> List[dict]:
+    """
+    多网页合并请求的 AI 分析，返回与 pages 一一对应的结果
+    已缓存的直接使用；其余按 token 预算分组，每组一次请求；
+    模型遗漏或格式错误的项回退为单个请求 (analyze_with_ai)，请求失败的组直接返回错误，不回退
+    合并请求与回退请求都在 semaphore 内执行，与逐个分析的并发上限相同
+    """
+    system_prompt = build_system_prompt(existing_categories, BATCH_OUTPUT)
+    results: List[Optional[dict]] = [None] * len(pages)
+    keys: List[str] = []
+    pending: List[Tuple[int, str]] = []
+    
+    for i, page_content in enumerate(pages):
+        _, user_content = build_prompts(page_content, existing_categories)
+        key = ai_cache_key(user_content, existing_categories, rename_mode, api_config)
+        keys.append(key)
+        cached = _ai_cache.get(key)
+        if cached is not None:
+            metrics.inc('ai_cache_hits')
+            results[i] = cached
+        else:
+            pending.append((i, user_content))
+    
+    async def request_batch(batch: List[Tuple[int, str]]) -> Dict[int, dict]:
+        async with semaphore:
+            return await request_ai_batch(client, system_prompt, batch, api_config)
+    
+    async def fallback(i: int) -> dict:
+        async with semaphore:
+            return await analyze_with_ai(client, pages[i], existing_categories, rename_mode, api_config)
+    
+    batches = pack_batches(pending, estimate_tokens(system_prompt))
+    replies = await asyncio.gather(*(request_batch(batch) for batch in batches))
+    for reply in replies:
+        for i, suggestion in reply.items():
+            results[i] = suggestion
+            if 'error' not in suggestion:
+                _ai_cache.set(keys[i], suggestion)
+    
+    missing = [i for i, _ in pending if results[i] is None]
+    if missing:
+        metrics.inc('ai_batch_fallbacks', len(missing))
+        fallbacks = await asyncio.gather(*(fallback(i) for i in missing))
+        for i, result in zip(missing, fallbacks):
+            results[i] = result
+    
+    return results
+
+def to_result(url: str, page_content: dict, ai_result: Optional[dict]) -> AnalyzeResult:
+    """抓取结果 + AI 结果 → AnalyzeResult"""
+    if 'error' in page_content:
+        return AnalyzeResult(
+            url=url,
+            success=False,
+            error=page_content['error']
+        )
+    
+    if 'error' in ai_result:
+        return AnalyzeResult(
+            url=url,
+            success=False,
+            title=page_content.get('title'),
+            error=ai_result['error']
+        )
+    
+    return AnalyzeResult(
+        url=url,
+        success=True,
+        title=page_content.get('title'),
+        suggestedName=ai_result.get('suggestedName'),
+        suggestedCategory=ai_result.get('suggestedCategory'),
+        isNewCategory=ai_result.get('isNewCategory', False)
+    )
 
 # 处理单个 URL
 async def process_url(
-    client: httpx.AsyncClient,
     url: str,
     existing_categories: List[str],
     rename_mode: str,
     api_config: ApiConfig,
-    semaphore: asyncio.Semaphore
+    semaphore: asyncio.Semaphore,
+    stats: page_cache.BatchCacheStats
 ) -> AnalyzeResult:
-    """处理单个 URL：抓取 + AI 分析"""
+    """处理单个 URL：抓取 (优先使用网页缓存) + AI 分析"""
     async with semaphore:
         # 1. 抓取网页
-        page_content = await fetch_page(client, url)
+        page_content = await fetch_page_cached(http_client.page_client(), url, stats)
         
         if 'error' in page_content:
-            return AnalyzeResult(
-                url=url,
-                success=False,
-                error=page_content['error']
-            )
+            return to_result(url, page_content, None)
         
         # 2. AI 分析
-        ai_result = await analyze_with_ai(client, page_content, existing_categories, rename_mode, api_config)
+        ai_result = await analyze_with_ai(http_client.ai_client(), page_content, existing_categories, rename_mode, api_config)
         
-        if 'error' in ai_result:
-            return AnalyzeResult(
-                url=url,
-                success=False,
-                title=page_content.get('title'),
-                error=ai_result['error']
-            )
+        return to_result(url, page_content, ai_result)
+
+async def process_batched(req: AnalyzeRequest, semaphore: asyncio.Semaphore, stats: page_cache.BatchCacheStats) -> List[AnalyzeResult]:
+    """先并发抓取全部网页，再把抓取成功的网页合并为少量 AI 请求"""
+    async def fetch(url: str) -> dict:
+        async with semaphore:
+            return await fetch_page_cached(http_client.page_client(), url, stats)
+    
+    pages = await asyncio.gather(*(fetch(url) for url in req.urls))
+    fetched = [page for page in pages if 'error' not in page]
+    ai_results = await analyze_batch_with_ai(
+        http_client.ai_client(), fetched, req.existingCategories, req.renameMode, req.apiConfig, semaphore
+    )
+    
+    ai_iter = iter(ai_results)
+    return [
+        to_result(url, page, None if 'error' in page else next(ai_iter))
+        for url, page in zip(req.urls, pages)
+    ]
+
+def _event(fmt: str, kind: str, data: dict) -> bytes:
+    """流式输出的一条记录: NDJSON 为 {"type": kind, ...}，SSE 为 event/data 帧"""
+    if fmt == 'sse':
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        return f'event: {kind}\ndata: {body}\n\n'.encode('utf-8')
+    body = json.dumps({'type': kind, **data}, ensure_ascii=False, separators=(',', ':'))
+    return (body + '\n').encode('utf-8')
+
+async def stream_results(
+    fmt: str,
+    req: AnalyzeRequest,
+    semaphore: asyncio.Semaphore,
+    stats: page_cache.BatchCacheStats
+) -> AsyncIterator[bytes]:
+    """
+    每个 URL 完成后立即输出其结果，全部完成后输出 summary
+    客户端断开时生成器被取消，未完成的抓取与 AI 请求随之取消
+    """
+    tasks = [
+        asyncio.create_task(process_url(url, req.existingCategories, req.renameMode, req.apiConfig, semaphore, stats))
+        for url in req.urls
+    ]
+    success_count = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            success_count += result.success
+            yield _event(fmt, 'result', result.model_dump())
         
-        return AnalyzeResult(
-            url=url,
-            success=True,
-            title=page_content.get('title'),
-            suggestedName=ai_result.get('suggestedName'),
-            suggestedCategory=ai_result.get('suggestedCategory'),
-            isNewCategory=ai_result.get('isNewCategory', False)
-        )
+        yield _event(fmt, 'summary', {
+            'total': len(tasks),
+            'success': success_count,
+            'failed': len(tasks) - success_count,
+            'cache': stats.to_dict()
+        })
+    except asyncio.CancelledError:
+        metrics.inc('batch_analyze_cancelled')
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 @router.post("/batch-analyze", response_model=AnalyzeResponse)
 async def batch_analyze(
     req: AnalyzeRequest,
-    current_user: User = Depends(get_current_user),
+    stream: Optional[str] = Query(None, pattern=STREAM_PATTERN),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """批量分析书签 URL"""
+    """
+    批量分析书签 URL
+    stream=ndjson|sse 时逐个输出完成的结果 (type=result)，最后输出汇总 (type=summary)；
+    流式模式下每个 URL 单独请求 AI，不使用 batchPrompts 合并
+    """
     
     if len(req.urls) > 100:
         raise HTTPException(status_code=400, detail="最多支持 100 个 URL")
@@ -230,9 +576,22 @@ async def batch_analyze(
     # 并发限制
     semaphore = asyncio.Semaphore(10)
     
-    async with httpx.AsyncClient() as client:
+    stats = page_cache.BatchCacheStats()
+    
+    if stream:
+        return StreamingResponse(
+            stream_results(stream, req, semaphore, stats),
+            media_type=STREAM_MEDIA_TYPES[stream],
+            # 关闭反向代理缓冲，结果到达即转发
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    # 使用应用级共享的 HTTP 客户端 (http_client)，连接在批次之间复用
+    if req.batchPrompts:
+        results = await process_batched(req, semaphore, stats)
+    else:
         tasks = [
-            process_url(client, url, req.existingCategories, req.renameMode, req.apiConfig, semaphore)
+            process_url(url, req.existingCategories, req.renameMode, req.apiConfig, semaphore, stats)
             for url in req.urls
         ]
         results = await asyncio.gather(*tasks)
@@ -243,15 +602,14 @@ async def batch_analyze(
         total=len(results),
         success=success_count,
         failed=len(results) - success_count,
-        results=results
+        results=results,
+        cache=stats.to_dict()
     )
 
 @router.post("/fetch-page")
 async def fetch_single_page(
     url: str,
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """抓取单个网页内容（调试用）"""
-    async with httpx.AsyncClient() as client:
-        result = await fetch_page(client, url)
-    return result
+    return await fetch_page(http_client.page_client(), url)
@@ -1,14 +1,26 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Iterable, List, Optional, Dict
 from datetime import datetime
 
-from models import User, Bookmark, SyncLog, get_db
-from auth import get_current_user
-from sync import smart_merge
+from models import User, Bookmark, SyncJobStatus, get_db
+from auth import CurrentUser, get_current_user
+from sync import (
+    bookmark_to_item, delta_item, live_items_query, changed_items_query,
+    folder_digests, xor_digest, ITEM_COLUMNS, run_sync, sync_head
+)
+from pagination import bookmark_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from streaming import stream_items, iter_rows, STREAM_FORMAT_PATTERN
+from codec import CompactRoute, negotiate, compact_response, encode_columns
+import idempotency
+import sync_queue
 
-router = APIRouter(prefix="/api", tags=["bookmark"])
+# CompactRoute: 请求体可为紧凑格式 (Content-Type) 或压缩 (Content-Encoding)
+router = APIRouter(prefix="/api", tags=["bookmark"], route_class=CompactRoute)
 
 class BookmarkItem(BaseModel):
     id: Optional[str] = None
@@ -20,6 +32,9 @@ class BookmarkItem(BaseModel):
 
 class SyncRequest(BaseModel):
     bookmarks: List[BookmarkItem]
+    cursor: Optional[str] = None  # 上次同步返回的游标，携带时只需上传变更
+    digest: Optional[str] = None  # 客户端书签树摘要 (sync.bookmark_hash 的异或)
+    folders: Optional[List[str]] = None  # 只返回这些文件夹 (全量模式)
 
 class SyncResponse(BaseModel):
     success: bool
@@ -29,6 +44,23 @@ class SyncResponse(BaseModel):
     conflicts: int
     bookmarks: List[BookmarkItem]
     last_sync_at: str
+    mode: str = "full"  # full: 完整列表; delta: 仅游标之后的变更; unchanged: 两端一致
+    cursor: str
+    digest: str
+
+class SyncJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued / running / done / failed
+    error: Optional[str] = None
+    result: Optional[SyncResponse] = None  # status 为 done 时返回
+
+class BookmarkPage(BaseModel):
+    bookmarks: List[BookmarkItem]
+    next_cursor: Optional[str] = None  # 为空表示没有下一页
+
+class TreeResponse(BaseModel):
+    digest: str
+    folders: Dict[str, str]
 
 class StatusResponse(BaseModel):
     logged_in: bool
@@ -37,71 +69,199 @@ class StatusResponse(BaseModel):
     bookmark_count: int
     sync_count: int
 
+def _sync_response(request: Request, stream: Optional[str], head: Dict, bookmarks: Iterable[Dict]):
+    """按请求的格式输出同步结果: 流式 / 紧凑格式 / JSON"""
+    if stream:
+        return stream_items(stream, iter(bookmarks), head=head)
+    
+    media_type = negotiate(request)
+    if media_type:
+        return compact_response(request, media_type, {
+            **head,
+            "bookmarks": encode_columns(bookmarks)
+        })
+    
+    return SyncResponse(**head, bookmarks=bookmarks)
+
 @router.post("/sync", response_model=SyncResponse)
-async def sync_bookmarks(
+def sync_bookmarks(
     req: SyncRequest,
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    stream: Optional[str] = Query(None, pattern=STREAM_FORMAT_PATTERN),
+    run_async: bool = Query(False, alias="async"),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # 转换为字典列表
-    local_bookmarks = [bm.model_dump() for bm in req.bookmarks]
+    """
+    stream=json|ndjson 时流式返回合并结果，不在内存中构建完整列表
+    Accept 为紧凑格式 (codec.COLUMNAR_*) 时返回列式编码结果
+    async=true 时入队由后台执行，返回 202 和 job_id，通过 /api/sync/jobs/{job_id} 获取结果
+    携带 Idempotency-Key 时，同一个键的重试直接返回首次请求的结果
+    """
+    user = db.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
     
-    # 执行智能合并
-    result = smart_merge(db, current_user.id, local_bookmarks)
+    key = request.headers.get(idempotency.HEADER)
+    if key:
+        cached = idempotency.begin(
+            db, current_user.id, key,
+            idempotency.request_hash(req.model_dump(), run_async)
+        )
+        if cached is not None:
+            if run_async:
+                return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=cached)
+            bookmarks = cached.pop("bookmarks")
+            return _sync_response(request, stream, cached, bookmarks)
     
-    # 更新用户最后同步时间
-    current_user.last_sync_at = datetime.utcnow()
-    db.commit()
+    try:
+        if run_async:
+            # 大账号首次同步可能超过网关超时: 入队后立即返回任务 ID，客户端轮询结果
+            job_id = sync_queue.enqueue(db, current_user.id, req.model_dump())
+            content = {"job_id": job_id, "status": SyncJobStatus.queued.value}
+            if key:
+                idempotency.complete(db, current_user.id, key, content)
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=content)
+        
+        # 需要保存响应时总是构建完整结果
+        result, since = run_sync(
+            db, user, [bm.model_dump() for bm in req.bookmarks],
+            cursor=req.cursor, digest=req.digest, folders=req.folders,
+            collect=not stream or bool(key)
+        )
+        head = sync_head(result, user.last_sync_at)
+        if key:
+            idempotency.complete(db, current_user.id, key, {**head, "bookmarks": result.merged_bookmarks})
+    except Exception:
+        if key:
+            idempotency.abort(db, current_user.id, key)
+        raise
     
-    return SyncResponse(
-        success=True,
-        added=result.added,
-        updated=result.updated,
-        deleted=result.deleted,
-        conflicts=result.conflicts,
-        bookmarks=[BookmarkItem(**bm) for bm in result.merged_bookmarks],
-        last_sync_at=current_user.last_sync_at.isoformat()
-    )
+    if stream and not key:
+        user_id = current_user.id
+        folders = req.folders
+        # 流式读取使用独立会话，先归还请求会话的连接，避免一个请求同时占用两个连接
+        db.close()
+        if result.mode == "unchanged":
+            items = iter(())
+        elif since is not None:
+            items = iter_rows(lambda s: changed_items_query(s, user_id, since), delta_item)
+        else:
+            items = iter_rows(lambda s: live_items_query(s, user_id, folders), bookmark_to_item)
+        return stream_items(stream, items, head=head)
+    
+    return _sync_response(request, stream, head, result.merged_bookmarks)
+
+@router.get("/sync/jobs/{job_id}", response_model=SyncJobResponse)
+async def get_sync_job(
+    job_id: str,
+    wait: int = Query(0, ge=0, le=sync_queue.MAX_WAIT),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    查询异步同步任务，wait > 0 时长轮询: 任务未结束则最多等待 wait 秒
+    等待期间不占用线程池，只在每次检查时短暂访问数据库
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        job = await run_in_threadpool(sync_queue.get_job, job_id, current_user.id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="同步任务不存在")
+        if job["status"] in (SyncJobStatus.done.value, SyncJobStatus.failed.value):
+            break
+        if loop.time() >= deadline:
+            break
+        await asyncio.sleep(sync_queue.POLL_INTERVAL)
+    
+    return SyncJobResponse(**job)
+
+@router.get("/sync/tree", response_model=TreeResponse)
+def get_sync_tree(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    按文件夹拆分的书签树摘要
+    整体摘要不一致时，客户端对比各文件夹摘要，只上传不同的文件夹并在 folders 中指定它们
+    """
+    folders = folder_digests(db, current_user.id)
+    return TreeResponse(digest=xor_digest(folders.values()), folders=folders)
 
 @router.get("/bookmarks", response_model=List[BookmarkItem])
-async def get_bookmarks(
-    current_user: User = Depends(get_current_user),
+def get_bookmarks(
+    request: Request,
+    stream: Optional[str] = Query(None, pattern=STREAM_FORMAT_PATTERN),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    bookmarks = db.query(Bookmark).filter(
-        Bookmark.user_id == current_user.id,
-        Bookmark.deleted_at.is_(None)
-    ).all()
+    """
+    stream=json 输出分块 JSON 数组，stream=ndjson 每行一个书签
+    Accept 为紧凑格式时返回 {"bookmarks": 列式编码}
+    """
+    if stream:
+        user_id = current_user.id
+        items = iter_rows(lambda s: live_items_query(s, user_id), bookmark_to_item)
+        return stream_items(stream, items)
     
-    return [
-        BookmarkItem(
-            id=bm.chrome_id or str(bm.id),
-            url=bm.url,
-            title=bm.title,
-            folderPath=bm.folder_path,
-            dateAdded=int(bm.created_at.timestamp() * 1000) if bm.created_at else None
-        )
-        for bm in bookmarks
-    ]
+    bookmarks = live_items_query(db, current_user.id).all()
+    
+    media_type = negotiate(request)
+    if media_type:
+        return compact_response(request, media_type, {
+            "bookmarks": encode_columns(bookmark_to_item(bm) for bm in bookmarks)
+        })
+    
+    return [BookmarkItem(**bookmark_to_item(bm)) for bm in bookmarks]
 
-@router.get("/status", response_model=StatusResponse)
-async def get_status(
-    current_user: User = Depends(get_current_user),
+@router.get("/bookmarks/page", response_model=BookmarkPage)
+def get_bookmarks_page(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    folder: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    bookmark_count = db.query(Bookmark).filter(
-        Bookmark.user_id == current_user.id,
-        Bookmark.deleted_at.is_(None)
-    ).count()
+    """
+    键集分页获取书签，用 next_cursor 请求下一页
+    - folder: 文件夹路径前缀过滤
+    - since: 毫秒时间戳，只返回此后修改过的书签 (含删除标记)
+    """
+    since_at = None
+    if since is not None:
+        try:
+            since_at = datetime.utcfromtimestamp(since / 1000)
+        except (ValueError, OverflowError, OSError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的 since 参数"
+            )
     
-    sync_count = db.query(SyncLog).filter(
-        SyncLog.user_id == current_user.id
-    ).count()
+    rows, next_cursor = bookmark_page(
+        db, current_user.id,
+        (*ITEM_COLUMNS, Bookmark.updated_at, Bookmark.deleted_at),
+        limit=limit, cursor=cursor, folder=folder, since=since_at
+    )
+    convert = delta_item if since_at is not None else bookmark_to_item
+    return BookmarkPage(bookmarks=[convert(row) for row in rows], next_cursor=next_cursor)
+
+@router.get("/status", response_model=StatusResponse)
+def get_status(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # 计数器由同步维护，按主键读取一行即可
+    user = db.query(
+        User.last_sync_at, User.bookmark_count, User.sync_count
+    ).filter(User.id == current_user.id).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
     
     return StatusResponse(
         logged_in=True,
         email=current_user.email,
-        last_sync_at=current_user.last_sync_at.isoformat() if current_user.last_sync_at else None,
-        bookmark_count=bookmark_count,
-        sync_count=sync_count
+        last_sync_at=user.last_sync_at.isoformat() if user.last_sync_at else None,
+        bookmark_count=user.bookmark_count,
+        sync_count=user.sync_count
     )
@@ -4,7 +4,8 @@ from pydantic import BaseModel, EmailStr
 from typing import Optional
 
 from models import User, get_db
-from auth import hash_password, verify_password, create_token, get_current_user
+from auth import CurrentUser, hash_password, verify_password, needs_rehash, create_token, get_current_user
+import stats
 
 router = APIRouter(prefix="/api", tags=["user"])
 
@@ -27,7 +28,7 @@ class UserInfoResponse(BaseModel):
     created_at: str
 
 @router.post("/register", response_model=TokenResponse)
-async def register(req: RegisterRequest, db: Session = Depends(get_db)):
+def register(req: RegisterRequest, db: Session = Depends(get_db)):
     # Check password length
     if len(req.password) < 6:
         raise HTTPException(
@@ -49,6 +50,8 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
         password_hash=hash_password(req.password)
     )
     db.add(user)
+    db.flush()
+    stats.record_registration(db, user.id)
     db.commit()
     db.refresh(user)
     
@@ -58,7 +61,7 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
     return TokenResponse(token=token, email=user.email)
 
 @router.post("/login", response_model=TokenResponse)
-async def login(req: LoginRequest, db: Session = Depends(get_db)):
+def login(req: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == req.email).first()
     
     if not user or not verify_password(req.password, user.password_hash):
@@ -73,15 +76,26 @@ async def login(req: LoginRequest, db: Session = Depends(get_db)):
             detail="账号已被禁用"
         )
     
+    # bcrypt cost 调整后，借登录时的明文密码透明升级
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(req.password)
+        db.commit()
+    
     token = create_token(user.id, user.email, user.is_admin)
     
     return TokenResponse(token=token, email=user.email)
 
 @router.get("/me", response_model=UserInfoResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+def get_me(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    user = db.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
     return UserInfoResponse(
-        id=current_user.id,
-        email=current_user.email,
-        last_sync_at=current_user.last_sync_at.isoformat() if current_user.last_sync_at else None,
-        created_at=current_user.created_at.isoformat()
+        id=user.id,
+        email=user.email,
+        last_sync_at=user.last_sync_at.isoformat() if user.last_sync_at else None,
+        created_at=user.created_at.isoformat()
     )
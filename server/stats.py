@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from config import get_settings
+from models import User, DailyStat, UserStatus
+
+settings = get_settings()
+
+# daily_stats 每天的分片数，同一用户固定落在 user_id % STATS_SHARDS 分片
+STATS_SHARDS = 16
+
+# 管理后台统计快照，多个管理员/多次刷新共用一次查询结果
+_snapshot_cache = TTLCache(maxsize=1, ttl=settings.STATS_CACHE_TTL)
+
+def _bump(db: Session, user_id: int, **counts: int):
+    """在调用方事务中累加当天 (UTC) 的统计，首次写入时插入该行"""
+    values = {"day": datetime.utcnow().date(), "shard": user_id % STATS_SHARDS, **counts}
+    stmt = mysql_insert(DailyStat.__table__).values(**values)
+    stmt = stmt.on_duplicate_key_update(
+        {name: DailyStat.__table__.c[name] + stmt.inserted[name] for name in counts}
+    )
+    db.execute(stmt)
+
+def record_sync(db: Session, user_id: int, added: int, updated: int, deleted: int):
+    """同步写入路径: 与书签写入、同步日志同一事务累加当天统计"""
+    _bump(db, user_id, syncs=1, added=added, updated=updated, deleted=deleted)
+
+def record_registration(db: Session, user_id: int):
+    """注册写入路径: 与新用户同一事务累加当天注册数"""
+    _bump(db, user_id, registrations=1)
+
+def invalidate_snapshot():
+    """用户状态被管理员修改后调用，下次请求立即重新统计"""
+    _snapshot_cache.clear()
+
+def get_snapshot(db: Session) -> Dict[str, int]:
+    """
+    管理后台概览: 用户数按状态分组一次查询，书签数/同步数取用户计数器之和，
+    今日同步数取 daily_stats 当天各分片之和，结果缓存 STATS_CACHE_TTL 秒
+    """
+    snapshot = _snapshot_cache.get("stats")
+    if snapshot is not None:
+        return snapshot
+    
+    rows = db.query(
+        User.status,
+        func.count(User.id),
+        func.coalesce(func.sum(User.bookmark_count), 0),
+        func.coalesce(func.sum(User.sync_count), 0)
+    ).group_by(User.status).all()
+    
+    by_status = {row[0]: row[1] for row in rows}
+    today_syncs = db.query(func.coalesce(func.sum(DailyStat.syncs), 0)).filter(
+        DailyStat.day == datetime.utcnow().date()
+    ).scalar()
+    
+    snapshot = {
+        "total_users": sum(row[1] for row in rows),
+        "active_users": by_status.get(UserStatus.active, 0),
+        "disabled_users": by_status.get(UserStatus.disabled, 0),
+        "total_bookmarks": int(sum(row[2] for row in rows)),
+        "total_syncs": int(sum(row[3] for row in rows)),
+        "today_syncs": int(today_syncs)
+    }
+    _snapshot_cache.set("stats", snapshot)
+    return snapshot
+
+def daily_series(db: Session, days: int) -> List[Dict[str, Any]]:
+    """最近 days 天 (含今天) 的每日统计，没有记录的日期补零"""
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    
+    rows = db.query(
+        DailyStat.day,
+        func.sum(DailyStat.syncs),
+        func.sum(DailyStat.added),
+        func.sum(DailyStat.updated),
+        func.sum(DailyStat.deleted),
+        func.sum(DailyStat.registrations)
+    ).filter(DailyStat.day >= start).group_by(DailyStat.day).all()
+    by_day = {row[0]: row for row in rows}
+    
+    series = []
+    for offset in range(days):
+        day: date = start + timedelta(days=offset)
+        row = by_day.get(day)
+        series.append({
+            "day": day.isoformat(),
+            "syncs": int(row[1]) if row else 0,
+            "added": int(row[2]) if row else 0,
+            "updated": int(row[3]) if row else 0,
+            "deleted": int(row[4]) if row else 0,
+            "registrations": int(row[5]) if row else 0
+        })
+    return series
@@ -0,0 +1,103 @@
+# 流式响应: 大账号的书签列表不在内存中整体构建，而是通过服务端游标分块读取，
+# 边读边写出为分块 JSON 数组或 NDJSON，峰值内存与书签总数无关
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query
+from starlette.concurrency import iterate_in_threadpool
+
+from config import get_settings
+from models import SessionLocal
+
+settings = get_settings()
+
+# 支持的流式格式
+STREAM_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+STREAM_FORMAT_PATTERN = "^(json|ndjson)$"
+
+# 每次从服务端游标拉取的行数，同时也是每个写出块包含的条目数
+CHUNK_SIZE = 500
+
+# iter_rows 的会话在整个响应期间占用一个连接，但只在读取每一块时占用线程，
+# 因此不受 WORKER_THREADS 限制，单独限制同时进行的流式响应数
+_stream_slots = asyncio.Semaphore(settings.DB_STREAM_SLOTS)
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def iter_rows(
+    build_query: Callable[[Any], Query],
+    convert: Callable[[Any], Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """
+    使用独立会话 + 服务端游标 (yield_per) 逐块读取
+    会话生命周期跟随生成器，不依赖请求结束时关闭的 get_db 会话
+    """
+    db = SessionLocal()
+    try:
+        for row in build_query(db).yield_per(CHUNK_SIZE):
+            yield convert(row)
+    finally:
+        db.close()
+
+def _encode_json(items: Iterable[Dict[str, Any]], head: Optional[Dict[str, Any]], key: str) -> Iterator[bytes]:
+    """head 为空时输出 JSON 数组，否则输出 {**head, key: [...]}"""
+    if head is None:
+        opening, closing = "[", "]"
+    else:
+        # 去掉 head 的右花括号，接上列表字段
+        prefix = _dumps(head)[:-1] + "," if head else "{"
+        opening = f'{prefix}"{key}":['
+        closing = "]}"
+    
+    buf = [opening]
+    first = True
+    for item in items:
+        buf.append(_dumps(item) if first else "," + _dumps(item))
+        first = False
+        if len(buf) >= CHUNK_SIZE:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+    buf.append(closing)
+    yield "".join(buf).encode("utf-8")
+
+def _encode_ndjson(items: Iterable[Dict[str, Any]], head: Optional[Dict[str, Any]]) -> Iterator[bytes]:
+    """head 不为空时作为第一行输出"""
+    buf = []
+    if head is not None:
+        buf.append(_dumps(head) + "\n")
+    for item in items:
+        buf.append(_dumps(item) + "\n")
+        if len(buf) >= CHUNK_SIZE:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+async def _limited(body: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """取得 _stream_slots 后才开始读取 (打开数据库会话)，排队时不占用线程和连接"""
+    async with _stream_slots:
+        async for chunk in iterate_in_threadpool(body):
+            yield chunk
+
+def stream_items(
+    fmt: str,
+    items: Iterable[Dict[str, Any]],
+    head: Optional[Dict[str, Any]] = None,
+    key: str = "bookmarks"
+) -> StreamingResponse:
+    if fmt == "ndjson":
+        body = _encode_ndjson(items, head)
+    else:
+        body = _encode_json(items, head, key)
+    # 关闭反向代理 (nginx /api) 缓冲，每块到达即转发给客户端
+    return StreamingResponse(
+        _limited(body),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers={"X-Accel-Buffering": "no"}
+    )
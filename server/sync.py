@@ -1,8 +1,19 @@
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Tuple, Optional, Set, Iterator, Iterable
+from datetime import datetime, timedelta
+import calendar
+import hashlib
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, Query
 
-from models import Bookmark, SyncLog, SyncAction
+from config import get_settings
+from models import User, Bookmark, SyncLog, SyncAction
+import stats
+
+settings = get_settings()
+
+# 批量写入时每条语句的最大行数
+BATCH_SIZE = 1000
 
 class SyncResult:
     def __init__(self):
@@ -11,11 +22,181 @@ class SyncResult:
         self.deleted = 0
         self.conflicts = 0
         self.merged_bookmarks: List[Dict] = []
+        self.mode = "full"  # full: 返回完整列表; delta: 仅返回游标之后的变更
+        self.cursor = ""
+        self.digest = EMPTY_DIGEST
+
+# 空书签树的摘要
+EMPTY_DIGEST = "0" * 64
+
+def bookmark_hash(url: Optional[str], title: Optional[str], folder_path: Optional[str]) -> str:
+    """
+    书签内容哈希: sha256(url \x1f title \x1f folder_path)，空值按空串处理
+    客户端用同样的算法计算本地摘要
+    """
+    raw = "\x1f".join((url or "", title or "", folder_path or ""))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def url_hash(url: str) -> str:
+    """定长 URL 键，对应唯一索引 (user_id, url_hash)"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+def xor_digest(hashes: Iterable[str], digest: str = EMPTY_DIGEST) -> str:
+    """
+    书签树摘要 = 各书签哈希的异或，与顺序无关
+    新增/删除一个书签只需异或一次，修改 = 异或旧哈希 + 异或新哈希
+    """
+    value = int(digest, 16)
+    for h in hashes:
+        value ^= int(h, 16)
+    return f"{value:064x}"
+
+def _row_hash(row: Any) -> str:
+    """优先使用已存储的 content_hash，旧数据现场计算"""
+    return row.content_hash or bookmark_hash(row.url, row.title, row.folder_path)
+
+def bookmark_size(url: Optional[str], title: Optional[str], folder_path: Optional[str]) -> int:
+    """书签占用字节数 (UTF-8)，与 MySQL LENGTH() 之和一致，用于 User.bookmark_bytes"""
+    return sum(len(v.encode("utf-8")) for v in (url, title, folder_path) if v)
+
+def _row_size(row: Any) -> int:
+    return bookmark_size(row.url, row.title, row.folder_path)
+
+def _chunks(items: List[Any], size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def encode_cursor(ts: datetime) -> str:
+    """同步游标: 秒级 UTC 时间戳 (与 MySQL DATETIME 精度一致)"""
+    return str(calendar.timegm(ts.utctimetuple()))
+
+def decode_cursor(cursor: Optional[str]) -> Optional[datetime]:
+    """解析客户端游标，无效/未来/过期的游标返回 None (回退全量合并)"""
+    if not cursor:
+        return None
+    try:
+        since = datetime.utcfromtimestamp(int(cursor))
+    except (ValueError, OverflowError, OSError):
+        return None
+    
+    now = datetime.utcnow()
+    if since > now:
+        return None
+    # 早于墓碑保留期的游标可能错过已被清理的删除记录，同样需要全量合并
+    max_age = min(settings.SYNC_CURSOR_MAX_AGE_DAYS, settings.TOMBSTONE_RETENTION_DAYS)
+    if since < now - timedelta(days=max_age):
+        return None
+    return since
+
+# 构造返回给客户端的书签所需的列 (只取列，不构造 ORM 实体)
+ITEM_COLUMNS = (
+    Bookmark.id,
+    Bookmark.chrome_id,
+    Bookmark.url,
+    Bookmark.title,
+    Bookmark.folder_path,
+    Bookmark.created_at
+)
+
+def bookmark_to_item(bm: Any) -> Dict[str, Any]:
+    """Bookmark 实体或 ITEM_COLUMNS 查询行 → 客户端书签格式"""
+    return {
+        "id": bm.chrome_id or str(bm.id),
+        "url": bm.url,
+        "title": bm.title,
+        "folderPath": bm.folder_path,
+        "dateAdded": int(bm.created_at.timestamp() * 1000) if bm.created_at else 0
+    }
+
+def delta_item(row: Any) -> Dict[str, Any]:
+    """增量结果中的书签，带删除标记"""
+    return {**bookmark_to_item(row), "deleted": row.deleted_at is not None}
+
+def live_items_query(db: Session, user_id: int, folders: Optional[List[str]] = None) -> Query:
+    """用户全部未删除书签 (ITEM_COLUMNS)，可限定文件夹"""
+    query = db.query(*ITEM_COLUMNS).filter(
+        Bookmark.user_id == user_id,
+        Bookmark.deleted_at.is_(None)
+    )
+    if folders is not None:
+        condition = Bookmark.folder_path.in_(folders)
+        if "" in folders:
+            # folder_digests 把 NULL 文件夹记为 ""
+            condition = or_(condition, Bookmark.folder_path.is_(None))
+        query = query.filter(condition)
+    return query
+
+def changed_items_query(db: Session, user_id: int, since: datetime) -> Query:
+    """游标之后新增/修改/删除的书签 (ITEM_COLUMNS + deleted_at)"""
+    return db.query(*ITEM_COLUMNS, Bookmark.deleted_at).filter(
+        Bookmark.user_id == user_id,
+        or_(Bookmark.updated_at >= since, Bookmark.deleted_at >= since)
+    ).order_by(Bookmark.id)
+
+def folder_digests(db: Session, user_id: int) -> Dict[str, str]:
+    """按文件夹分组的摘要 (Merkle 式拆分)，客户端据此只交换摘要不同的文件夹"""
+    digests: Dict[str, str] = {}
+    rows = db.query(
+        Bookmark.folder_path,
+        Bookmark.content_hash,
+        Bookmark.url,
+        Bookmark.title
+    ).filter(
+        Bookmark.user_id == user_id,
+        Bookmark.deleted_at.is_(None)
+    ).yield_per(BATCH_SIZE)
+    
+    for row in rows:
+        folder = row.folder_path or ""
+        digests[folder] = xor_digest([_row_hash(row)], digests.get(folder, EMPTY_DIGEST))
+    return digests
+
+def _build_merged(
+    cloud_rows: List[Any],
+    inserts: Dict[str, Dict[str, Any]],
+    updates: Dict[int, Dict[str, Any]],
+    deleted_ids: Set[int]
+) -> List[Dict[str, Any]]:
+    """由内存中的云端索引 + 已应用的变更构建合并结果，无需再次全表读取"""
+    merged = []
+    for row in cloud_rows:
+        if row.id in deleted_ids:
+            continue
+        item = bookmark_to_item(row)
+        change = updates.get(row.id)
+        if change:
+            item["id"] = change["chrome_id"] or str(row.id)
+            item["title"] = change["title"]
+            item["folderPath"] = change["folder_path"]
+        merged.append(item)
+    
+    for bm in inserts.values():
+        merged.append({
+            "id": bm["chrome_id"],
+            "url": bm["url"],
+            "title": bm["title"],
+            "folderPath": bm["folder_path"],
+            "dateAdded": int(bm["created_at"].timestamp() * 1000)
+        })
+    return merged
+
+def lock_user(db: Session, user_id: int) -> Optional[str]:
+    """
+    锁定用户行 (SELECT ... FOR UPDATE) 直到本次合并提交，返回当前书签树摘要
+    多设备同时同步时后到的请求在此等待，随后基于前一次合并的结果计算，摘要与计数器不会丢失更新
+    先结束当前事务: REPEATABLE READ 的快照在首次一致性读时建立，必须在拿到锁之后才能建立，
+    否则等锁期间其它请求提交的书签对本次合并不可见
+    """
+    db.commit()
+    return db.query(User.tree_digest).filter(User.id == user_id).with_for_update().scalar()
 
 def smart_merge(
     db: Session,
     user_id: int,
-    local_bookmarks: List[Dict[str, Any]]
+    local_bookmarks: List[Dict[str, Any]],
+    since: Optional[datetime] = None,
+    collect: bool = True,
+    folders: Optional[List[str]] = None
 ) -> SyncResult:
     """
     智能合并书签
@@ -23,27 +204,51 @@ def smart_merge(
     - 新增: 云端/本地独有的书签 → 合并保留
     - 修改: 同 URL 不同标题 → 取最新
     - 删除: 本地标记删除 → 云端也删除
+    
+    增量模式 (since 不为空):
+    - local_bookmarks 仅包含客户端自游标以来的变更
+    - 返回云端自游标以来的变更 (含删除标记)，而非完整列表
+    
+    collect=False 时不构建 merged_bookmarks，由调用方自行流式读取
+    folders 不为空时全量结果只包含这些文件夹 (配合 folder_digests 使用)
     """
     result = SyncResult()
+    # 同一用户的合并串行执行，读取云端书签之前先锁定用户行
+    stored_digest = lock_user(db, user_id)
     
-    # 获取云端书签 (未删除的)
-    cloud_bookmarks = db.query(Bookmark).filter(
+    # 游标取本次同步开始时间，下次增量从这里开始 (>= 比较，重复下发是幂等的)
+    sync_started = datetime.utcnow().replace(microsecond=0)
+    result.cursor = encode_cursor(sync_started)
+    
+    # 获取云端书签 (未删除的)，只取合并需要的列，不构造 ORM 实体
+    cloud_query = db.query(
+        *ITEM_COLUMNS,
+        Bookmark.updated_at,
+        Bookmark.content_hash
+    ).filter(
         Bookmark.user_id == user_id,
         Bookmark.deleted_at.is_(None)
-    ).all()
+    )
+    if since is not None:
+        # 增量: 只按本次上传的 URL 点查，不读取整棵树
+        local_hashes = list({url_hash(bm["url"]) for bm in local_bookmarks if bm.get("url")})
+        cloud_rows = []
+        for chunk in _chunks(local_hashes):
+            cloud_rows.extend(cloud_query.filter(Bookmark.url_hash.in_(chunk)).all())
+    else:
+        cloud_rows = cloud_query.all()
     
     # 建立云端 URL 索引
-    cloud_by_url: Dict[str, Bookmark] = {}
-    for bm in cloud_bookmarks:
-        if bm.url:
-            cloud_by_url[bm.url] = bm
-    
-    # 建立本地 URL 索引
-    local_by_url: Dict[str, Dict] = {}
-    for bm in local_bookmarks:
-        url = bm.get("url")
-        if url:
-            local_by_url[url] = bm
+    cloud_by_url: Dict[str, Any] = {}
+    for row in cloud_rows:
+        if row.url:
+            cloud_by_url[row.url] = row
+    
+    # 先在内存中算出变更集，再批量写入
+    now = datetime.utcnow()
+    inserts: Dict[str, Dict[str, Any]] = {}  # url → 新书签 (同 URL 只插入一次)
+    updates: Dict[int, Dict[str, Any]] = {}  # id → 更新字段
+    deleted_ids: Set[int] = set()
     
     # 处理本地书签
     for local_bm in local_bookmarks:
@@ -62,56 +267,104 @@ def smart_merge(
             
             if is_deleted:
                 # 本地删除 → 标记云端删除
-                cloud_bm.deleted_at = datetime.utcnow()
-                result.deleted += 1
-            else:
+                deleted_ids.add(cloud_bm.id)
+                updates.pop(cloud_bm.id, None)
+            elif cloud_bm.id not in deleted_ids:
                 # 比较更新时间，取最新
                 cloud_updated = cloud_bm.updated_at.timestamp() * 1000 if cloud_bm.updated_at else 0
                 
-                if local_updated > cloud_updated:
+                content_hash = bookmark_hash(url, title, folder_path)
+                unchanged = content_hash == _row_hash(cloud_bm) and chrome_id == cloud_bm.chrome_id
+                
+                if local_updated > cloud_updated and not unchanged:
                     # 本地更新
-                    cloud_bm.title = title
-                    cloud_bm.folder_path = folder_path
-                    cloud_bm.chrome_id = chrome_id
-                    cloud_bm.updated_at = datetime.utcnow()
-                    result.updated += 1
+                    updates[cloud_bm.id] = {
+                        "id": cloud_bm.id,
+                        "title": title,
+                        "folder_path": folder_path,
+                        "chrome_id": chrome_id,
+                        "content_hash": content_hash,
+                        "updated_at": now
+                    }
         else:
             if not is_deleted:
                 # 本地独有 → 添加到云端
-                new_bm = Bookmark(
-                    user_id=user_id,
-                    chrome_id=chrome_id,
-                    url=url,
-                    title=title,
-                    folder_path=folder_path
-                )
-                db.add(new_bm)
-                result.added += 1
-    
-    # 检查云端独有的书签 (本地不存在的)
-    for url, cloud_bm in cloud_by_url.items():
-        if url not in local_by_url:
-            # 云端独有，保留 (会返回给客户端)
-            pass
+                inserts[url] = {
+                    "user_id": user_id,
+                    "chrome_id": chrome_id,
+                    "url": url,
+                    "url_hash": url_hash(url),
+                    "title": title,
+                    "folder_path": folder_path,
+                    "content_hash": bookmark_hash(url, title, folder_path),
+                    "created_at": now,
+                    "updated_at": now
+                }
+            else:
+                inserts.pop(url, None)
     
-    db.commit()
+    # 合并前的书签树摘要 (缺失时由合并前的数据计算，需在写入之前)
+    if stored_digest:
+        digest = stored_digest
+    elif since is None:
+        digest = xor_digest(_row_hash(row) for row in cloud_rows)
+    else:
+        digest = xor_digest(folder_digests(db, user_id).values())
     
-    # 获取合并后的完整书签列表
-    merged = db.query(Bookmark).filter(
-        Bookmark.user_id == user_id,
-        Bookmark.deleted_at.is_(None)
-    ).all()
+    # 批量写入: 每批一条多行语句，避免逐行 INSERT/UPDATE 和庞大的 identity map
+    for chunk in _chunks(list(deleted_ids)):
+        db.execute(
+            update(Bookmark)
+            .where(Bookmark.id.in_(chunk))
+            .values(deleted_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    
+    for chunk in _chunks(list(updates.values())):
+        # ORM 按主键批量更新 (executemany)
+        db.execute(update(Bookmark), chunk)
+    
+    for chunk in _chunks(list(inserts.values())):
+        # 多行 INSERT；同 URL 的墓碑由唯一索引 uq_bookmarks_user_url_hash 命中后直接复活
+        stmt = mysql_insert(Bookmark.__table__).values(chunk)
+        db.execute(stmt.on_duplicate_key_update(
+            chrome_id=stmt.inserted.chrome_id,
+            title=stmt.inserted.title,
+            folder_path=stmt.inserted.folder_path,
+            content_hash=stmt.inserted.content_hash,
+            updated_at=stmt.inserted.updated_at,
+            deleted_at=None
+        ))
+    
+    result.added = len(inserts)
+    result.updated = len(updates)
+    result.deleted = len(deleted_ids)
     
-    result.merged_bookmarks = [
+    # 增量维护书签树摘要: 删除/修改异或掉旧哈希，修改/新增异或上新哈希
+    touched = {row.id: row for row in cloud_rows if row.id in deleted_ids or row.id in updates}
+    hashes = [_row_hash(touched[bm_id]) for bm_id in deleted_ids]
+    for change in updates.values():
+        hashes.append(_row_hash(touched[change["id"]]))
+        hashes.append(change["content_hash"])
+    hashes.extend(bm["content_hash"] for bm in inserts.values())
+    result.digest = xor_digest(hashes, digest)
+    
+    # 用户计数器 (书签数/字节数/同步次数) 与书签写入、同步日志在同一事务中更新
+    bytes_delta = sum(bookmark_size(bm["url"], bm["title"], bm["folder_path"]) for bm in inserts.values())
+    bytes_delta -= sum(_row_size(touched[bm_id]) for bm_id in deleted_ids)
+    for change in updates.values():
+        row = touched[change["id"]]
+        bytes_delta += bookmark_size(row.url, change["title"], change["folder_path"]) - _row_size(row)
+    
+    db.query(User).filter(User.id == user_id).update(
         {
-            "id": bm.chrome_id or str(bm.id),
-            "url": bm.url,
-            "title": bm.title,
-            "folderPath": bm.folder_path,
-            "dateAdded": int(bm.created_at.timestamp() * 1000) if bm.created_at else 0
-        }
-        for bm in merged
-    ]
+            User.tree_digest: result.digest,
+            User.bookmark_count: User.bookmark_count + len(inserts) - len(deleted_ids),
+            User.bookmark_bytes: User.bookmark_bytes + bytes_delta,
+            User.sync_count: User.sync_count + 1
+        },
+        synchronize_session=False
+    )
     
     # 记录同步日志
     log = SyncLog(
@@ -123,6 +376,72 @@ def smart_merge(
         conflicts=result.conflicts
     )
     db.add(log)
+    stats.record_sync(db, user_id, result.added, result.updated, result.deleted)
     db.commit()
     
+    if since is not None:
+        # 增量: 仅返回游标之后新增/修改/删除的书签
+        result.mode = "delta"
+        if collect:
+            changed = changed_items_query(db, user_id, since).all()
+            result.merged_bookmarks = [delta_item(row) for row in changed]
+    elif not collect:
+        pass
+    elif all(bm["chrome_id"] for bm in inserts.values()):
+        merged = _build_merged(cloud_rows, inserts, updates, deleted_ids)
+        if folders is not None:
+            wanted = set(folders)
+            merged = [item for item in merged if (item["folderPath"] or "") in wanted]
+        result.merged_bookmarks = merged
+    else:
+        # 新书签没有 chrome_id 时需要数据库分配的 id，回退到只取列的查询
+        merged = live_items_query(db, user_id, folders).all()
+        result.merged_bookmarks = [bookmark_to_item(row) for row in merged]
+    
     return result
+
+def run_sync(
+    db: Session,
+    user: User,
+    bookmarks: List[Dict[str, Any]],
+    cursor: Optional[str] = None,
+    digest: Optional[str] = None,
+    folders: Optional[List[str]] = None,
+    collect: bool = True
+) -> Tuple[SyncResult, Optional[datetime]]:
+    """
+    一次同步请求的完整处理 (/api/sync 与 sync_queue 共用)，返回 (结果, 增量起点)
+    客户端摘要与云端一致且没有本地变更 → 两端书签树相同，不访问 bookmarks 表
+    """
+    since = None
+    if digest and not bookmarks and digest == user.tree_digest:
+        result = SyncResult()
+        result.mode = "unchanged"
+        result.digest = digest
+        result.cursor = encode_cursor(datetime.utcnow())
+    else:
+        # 游标有效时走增量合并，未知/过期则回退全量
+        since = decode_cursor(cursor)
+        result = smart_merge(
+            db, user.id, bookmarks,
+            since=since, collect=collect, folders=folders
+        )
+    
+    # 更新用户最后同步时间
+    user.last_sync_at = datetime.utcnow()
+    db.commit()
+    return result, since
+
+def sync_head(result: SyncResult, last_sync_at: datetime) -> Dict[str, Any]:
+    """同步响应中除书签列表以外的字段"""
+    return {
+        "success": True,
+        "added": result.added,
+        "updated": result.updated,
+        "deleted": result.deleted,
+        "conflicts": result.conflicts,
+        "last_sync_at": last_sync_at.isoformat(),
+        "mode": result.mode,
+        "cursor": result.cursor,
+        "digest": result.digest
+    }
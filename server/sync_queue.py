@@ -0,0 +1,274 @@
+# 异步同步队列: /api/sync?async=true 把请求写入 sync_jobs 表后立即返回，
+# 由工作线程领取执行 smart_merge，客户端通过 /api/sync/jobs/{job_id} 轮询结果
+# 队列在数据库中，工作线程可以运行在 API 进程内 (SYNC_WORKERS > 0)，
+# 也可以单独部署: python sync_queue.py
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from codec import pack_json, unpack_json
+from config import get_settings
+from models import SessionLocal, User, SyncJob, SyncJobStatus
+from sync import run_sync, sync_head
+import metrics
+
+settings = get_settings()
+
+# 长轮询最长等待秒数与检查间隔
+MAX_WAIT = 30
+POLL_INTERVAL = 0.5
+
+# 队列为空时工作线程的休眠秒数
+IDLE_SLEEP = 1.0
+
+# 领取时每次考察的候选任务数
+CLAIM_CANDIDATES = 20
+
+_stop = threading.Event()
+_threads: List[threading.Thread] = []
+
+def enqueue(db: Session, user_id: int, payload: Dict[str, Any]) -> str:
+    """写入一个待执行的同步任务，返回任务 ID"""
+    job = SyncJob(
+        public_id=uuid.uuid4().hex,
+        user_id=user_id,
+        status=SyncJobStatus.queued,
+        payload=pack_json(payload)
+    )
+    db.add(job)
+    db.commit()
+    metrics.inc("sync_jobs_enqueued")
+    return job.public_id
+
+def get_job(job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """查询任务状态 (只能查询自己的任务)，完成时附带同步结果"""
+    db = SessionLocal()
+    try:
+        row = db.query(
+            SyncJob.public_id, SyncJob.status, SyncJob.error, SyncJob.result
+        ).filter(
+            SyncJob.public_id == job_id,
+            SyncJob.user_id == user_id
+        ).first()
+        if row is None:
+            return None
+        return {
+            "job_id": row.public_id,
+            "status": row.status.value,
+            "error": row.error,
+            "result": unpack_json(row.result) if row.result is not None else None
+        }
+    finally:
+        db.close()
+
+# 领取条件: 排队中，且是该用户最早的未完成任务
+# 同一用户已有执行中的任务时，最早的未完成任务就是它，后续任务都不满足条件，
+# 因此同一用户的同步按提交顺序串行执行，不同用户并行执行
+# SKIP LOCKED 跳过其它工作线程正在领取的行，多个工作线程/进程互不阻塞
+CLAIM_SQL = text("""
+    SELECT j.id FROM sync_jobs j
+    WHERE j.status = 'queued'
+      AND j.id = (
+          SELECT MIN(p.id) FROM sync_jobs p
+          WHERE p.user_id = j.user_id AND p.status IN ('queued', 'running')
+      )
+    ORDER BY j.id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+""")
+
+def claim(db: Session) -> Optional[SyncJob]:
+    """领取一个任务并标记为执行中，没有可执行的任务时返回 None"""
+    ids = [row[0] for row in db.execute(CLAIM_SQL, {"limit": CLAIM_CANDIDATES})]
+    if not ids:
+        db.rollback()
+        return None
+    
+    now = datetime.utcnow()
+    job = db.get(SyncJob, ids[0])
+    job.status = SyncJobStatus.running
+    job.attempts += 1
+    job.started_at = now
+    job.lease_until = now + timedelta(seconds=settings.SYNC_JOB_LEASE)
+    db.commit()
+    return job
+
+def _owned(job_id: int, attempt: int):
+    """本次执行仍持有任务的条件: 执行中且 attempts 未变 (未被 requeue_stale 重新排队后再次领取)"""
+    return (
+        SyncJob.id == job_id,
+        SyncJob.status == SyncJobStatus.running,
+        SyncJob.attempts == attempt
+    )
+
+def renew_lease(db: Session, job_id: int, attempt: int) -> bool:
+    """续租，返回 False 表示租约已失效 (任务已被重新排队或结束)"""
+    renewed = db.query(SyncJob).filter(*_owned(job_id, attempt)).update(
+        {SyncJob.lease_until: datetime.utcnow() + timedelta(seconds=settings.SYNC_JOB_LEASE)},
+        synchronize_session=False
+    )
+    db.commit()
+    return renewed == 1
+
+def _heartbeat(job_id: int, attempt: int, finished: threading.Event):
+    """执行期间每 SYNC_JOB_HEARTBEAT 秒续租一次；合并在工作线程中阻塞执行，续租使用独立线程和会话"""
+    while not finished.wait(settings.SYNC_JOB_HEARTBEAT):
+        db = SessionLocal()
+        try:
+            if not renew_lease(db, job_id, attempt):
+                print(f"Sync job {job_id} lease lost")
+                return
+        except Exception as e:
+            print(f"Sync job {job_id} heartbeat error: {e}")
+        finally:
+            db.close()
+
+def _finish(db: Session, job_id: int, attempt: int, status: SyncJobStatus, result: Optional[bytes] = None, error: Optional[str] = None) -> bool:
+    """
+    写回结果 (比较并设置): 只有任务仍由本次执行持有时才更新
+    租约过期后任务可能已被重新排队并由其它工作线程执行，此时丢弃本次结果，返回 False
+    """
+    updated = db.query(SyncJob).filter(*_owned(job_id, attempt)).update(
+        {
+            SyncJob.status: status,
+            SyncJob.result: result,
+            SyncJob.error: error,
+            SyncJob.finished_at: datetime.utcnow(),
+            SyncJob.lease_until: None,
+            # 请求体不再需要，释放空间
+            SyncJob.payload: b""
+        },
+        synchronize_session=False
+    )
+    db.commit()
+    if updated != 1:
+        print(f"Sync job {job_id} attempt {attempt} no longer owned, result discarded")
+        metrics.inc("sync_jobs_lease_lost")
+        return False
+    return True
+
+def run_job(db: Session, job: SyncJob):
+    """执行已领取的任务，结果或错误写回任务行；执行期间由心跳线程续租"""
+    started = time.perf_counter()
+    # 领取时的值: 合并过程中的提交会使 ORM 对象过期，之后再读取可能已是其它执行的值
+    job_id, attempt, public_id = job.id, job.attempts, job.public_id
+    finished = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(job_id, attempt, finished), name=f"sync-heartbeat-{job_id}", daemon=True
+    )
+    heartbeat.start()
+    try:
+        user = db.get(User, job.user_id)
+        if user is None:
+            _finish(db, job_id, attempt, SyncJobStatus.failed, error="用户不存在")
+            return
+        
+        payload = unpack_json(job.payload)
+        result, _ = run_sync(
+            db, user, payload.get("bookmarks") or [],
+            cursor=payload.get("cursor"), digest=payload.get("digest"), folders=payload.get("folders")
+        )
+        response = {**sync_head(result, user.last_sync_at), "bookmarks": result.merged_bookmarks}
+        if _finish(db, job_id, attempt, SyncJobStatus.done, result=pack_json(response)):
+            metrics.inc("sync_jobs_done")
+    except Exception as e:
+        db.rollback()
+        print(f"Sync job {public_id} failed: {e}")
+        if _finish(db, job_id, attempt, SyncJobStatus.failed, error="同步失败"):
+            metrics.inc("sync_jobs_failed")
+    finally:
+        finished.set()
+        heartbeat.join()
+        metrics.observe("sync_job_seconds", time.perf_counter() - started)
+
+def _worker():
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            job = claim(db)
+            if job is None:
+                db.close()
+                _stop.wait(IDLE_SLEEP)
+                continue
+            run_job(db, job)
+        except Exception as e:
+            print(f"Sync worker error: {e}")
+            _stop.wait(IDLE_SLEEP)
+        finally:
+            db.close()
+
+def start(workers: int = settings.SYNC_WORKERS):
+    _stop.clear()
+    for i in range(workers):
+        thread = threading.Thread(target=_worker, name=f"sync-worker-{i}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+def stop(timeout: float = 5.0):
+    """通知工作线程退出；执行中的合并不中断，进程退出后租约过期，由 requeue_stale 重新排队"""
+    _stop.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
+
+def requeue_stale(db: Session) -> int:
+    """
+    租约过期 (SYNC_JOB_LEASE 内没有续租) 的任务视为工作进程已退出: 未超过重试次数的重新排队，否则标记失败
+    执行时间长但仍在续租的任务不受影响。万一原执行仍在进行，其结果会被 _finish 丢弃
+    
+    重新执行是安全的: lock_user 的提交发生在写入之前，书签、计数器与同步日志在 smart_merge 的
+    同一个事务中提交，run_sync 随后的提交只更新 last_sync_at。中断的任务要么没有写入书签，
+    要么已完整合并；后一种情况下用同一请求体再合并一次不会改变书签，只会多记一次同步
+    """
+    now = datetime.utcnow()
+    stale = db.query(SyncJob).filter(
+        SyncJob.status == SyncJobStatus.running,
+        SyncJob.lease_until < now
+    ).with_for_update(skip_locked=True).all()
+    
+    for job in stale:
+        job.lease_until = None
+        if job.attempts >= settings.SYNC_JOB_MAX_ATTEMPTS:
+            job.status = SyncJobStatus.failed
+            job.error = "同步超时"
+            job.finished_at = now
+            job.payload = b""
+        else:
+            job.status = SyncJobStatus.queued
+    db.commit()
+    return len(stale)
+
+def purge_finished(db: Session, batch_size: int = 1000) -> int:
+    """删除结束超过 SYNC_JOB_RETENTION 秒的任务 (结果已过了客户端领取的时间窗口)"""
+    threshold = datetime.utcnow() - timedelta(seconds=settings.SYNC_JOB_RETENTION)
+    purged = 0
+    while True:
+        ids = [row.id for row in db.query(SyncJob.id).filter(
+            SyncJob.status.in_([SyncJobStatus.done, SyncJobStatus.failed]),
+            SyncJob.finished_at < threshold
+        ).limit(batch_size)]
+        if not ids:
+            break
+        purged += db.query(SyncJob).filter(SyncJob.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+    return purged
+
+def maintain(db: Session) -> int:
+    """定时维护 (jobs.py): 重新排队超时任务并清理已结束的任务"""
+    return requeue_stale(db) + purge_finished(db)
+
+if __name__ == "__main__":
+    # 独立工作进程: API 进程设置 SYNC_WORKERS=0，由此进程消费队列
+    workers = max(settings.SYNC_WORKERS, 1)
+    print(f"Starting {workers} sync workers")
+    start(workers)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop()
@@ -0,0 +1,5 @@
+# 测试从 server 目录导入模块 (与 uvicorn main:app 相同)，不需要数据库: 数据库依赖由各测试替换
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from routers import analyze
+
+PAGE = {"url": "https://example.com/", "title": "Example"}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """替换 request_ai: 依次返回 replies 中的结果，记录调用次数"""
+    calls = []
+    replies = []
+    
+    async def request_ai(client, system_prompt, user_content, api_config):
+        calls.append(api_config.apiKey)
+        return replies.pop(0)
+    
+    monkeypatch.setattr(analyze, "request_ai", request_ai)
+    analyze._ai_cache.clear()
+    yield calls, replies
+    analyze._ai_cache.clear()
+
+def analyze_page(api_key: str) -> dict:
+    config = analyze.ApiConfig(apiUrl="https://ai.example.com/v1/chat/completions", apiKey=api_key)
+    return asyncio.run(analyze.analyze_with_ai(None, PAGE, [], "normal", config))
+
+@pytest.mark.parametrize("status", [400, 401, 404, 429])
+def test_http_errors_are_not_shared(upstream, status):
+    calls, replies = upstream
+    replies += [{"error": f"AI API 错误: {status}", "status": status}, {"suggestedName": "Example"}]
+    
+    assert analyze_page("misconfigured")["status"] == status
+    assert analyze_page("valid") == {"suggestedName": "Example"}
+    assert calls == ["misconfigured", "valid"]
+
+def test_format_errors_are_cached(upstream):
+    calls, replies = upstream
+    replies += [{"error": analyze.FORMAT_ERROR}]
+    
+    assert analyze_page("a")["error"] == analyze.FORMAT_ERROR
+    assert analyze_page("b")["error"] == analyze.FORMAT_ERROR
+    assert calls == ["a"]
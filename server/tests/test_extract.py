@@ -0,0 +1,26 @@
+import asyncio
+
+import extract
+
+def extract_html(html: str, chunk_size: int = 4096):
+    """按 chunk_size 分块解析，返回 (提取结果, 实际读取的字节数)"""
+    body = html.encode("utf-8")
+    read = [0]
+    
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            read[0] += len(body[i:i + chunk_size])
+            yield body[i:i + chunk_size]
+    
+    result = asyncio.run(extract.extract_stream(chunks(), "text/html; charset=utf-8", 512 * 1024))
+    return result, read[0]
+
+def test_inline_elements_do_not_split_words():
+    result, _ = extract_html("<body><p>foo<b>bar</b> baz <a href=/>li</a>nk</p><p>next</p></body>", chunk_size=5)
+    assert result["text"] == "foobar baz link next"
+
+def test_stops_early_without_body_or_head_end_tags():
+    html = "<title>Page</title><h1>Heading</h1>" + "<p>some paragraph text</p>" * 20000
+    result, read = extract_html(html)
+    assert (result["title"], result["h1"]) == ("Page", "Heading")
+    assert read < len(html) // 10
@@ -0,0 +1,48 @@
+import asyncio
+
+import http_client
+
+async def serve_with_cookie(received: list):
+    """每个响应都设置 Cookie，记录每个请求携带的 Cookie 头"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            cookie = None
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "cookie":
+                    cookie = value.strip()
+            received.append(cookie)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nSet-Cookie: session=user-a; Path=/\r\n"
+                b"Set-Cookie: __cf_bm=token; Path=/; HttpOnly\r\nContent-Length: 2\r\n\r\nok"
+            )
+            await writer.drain()
+        writer.close()
+    
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+def test_shared_clients_do_not_persist_cookies():
+    async def run():
+        received = []
+        server = await serve_with_cookie(received)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+        http_client.start()
+        try:
+            for client in (http_client.page_client(), http_client.ai_client()):
+                first = await client.get(url)
+                assert first.headers.get_list("set-cookie")
+                await client.get(url)
+                assert not client.cookies
+        finally:
+            await http_client.close()
+            server.close()
+            await server.wait_closed()
+        return received
+    
+    assert asyncio.run(run()) == [None] * 4
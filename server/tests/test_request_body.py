@@ -0,0 +1,72 @@
+import gzip
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import CurrentUser, get_current_user
+from codec import settings
+from models import get_db
+from routers import bookmark
+from sync import SyncResult
+
+class FakeSession:
+    def get(self, model, ident):
+        return SimpleNamespace(id=ident, last_sync_at=datetime.utcnow())
+
+@pytest.fixture
+def client(monkeypatch):
+    """/api/sync 只校验请求体解析: 替换认证与数据库，run_sync 返回收到的书签数"""
+    def run_sync(db, user, items, **kwargs):
+        result = SyncResult()
+        result.added = len(items)
+        return result, None
+    
+    monkeypatch.setattr(bookmark, "run_sync", run_sync)
+    main.app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=1, email="user@example.com", is_admin=False, status="active")
+    main.app.dependency_overrides[get_db] = lambda: FakeSession()
+    # 不进入 lifespan，启动事件 (建表、后台任务) 不会执行
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+def sync_body(count: int) -> bytes:
+    bookmarks = [
+        {
+            "id": str(i),
+            "url": f"https://example.com/articles/{i}/a-reasonably-long-slug-for-a-bookmarked-page",
+            "title": f"Bookmarked page number {i} with a typical title length",
+            "folderPath": "Bookmarks Bar/Reading/Later",
+            "dateAdded": 1700000000000 + i
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"bookmarks": bookmarks}).encode("utf-8")
+
+def test_large_plain_json_sync_is_accepted(client):
+    body = sync_body(50000)
+    assert len(body) > settings.MAX_REQUEST_BODY_BYTES
+    
+    response = client.post("/api/sync", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["added"] == 50000
+
+def test_plain_json_over_decoded_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_DECODED_BODY_BYTES", 1024 * 1024)
+    response = client.post("/api/sync", content=sync_body(10000), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+
+def test_compressed_body_over_raw_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_REQUEST_BODY_BYTES", 1024)
+    body = gzip.compress(sync_body(1000))
+    response = client.post("/api/sync", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+def test_compressed_body_over_decoded_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_DECODED_BODY_BYTES", 1024 * 1024)
+    body = gzip.compress(sync_body(10000))
+    assert len(body) < settings.MAX_REQUEST_BODY_BYTES
+    response = client.post("/api/sync", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 413
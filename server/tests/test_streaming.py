@@ -0,0 +1,26 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import streaming
+
+app = FastAPI()
+
+@app.get("/items")
+def items(fmt: str):
+    return streaming.stream_items(fmt, ({"id": str(i)} for i in range(1200)), head={"success": True})
+
+client = TestClient(app)
+
+def test_stream_json_disables_proxy_buffering():
+    response = client.get("/items", params={"fmt": "json"})
+    assert response.headers["x-accel-buffering"] == "no"
+    body = response.json()
+    assert body["success"] and len(body["bookmarks"]) == 1200
+
+def test_stream_ndjson_writes_head_then_items():
+    response = client.get("/items", params={"fmt": "ndjson"})
+    assert response.headers["x-accel-buffering"] == "no"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0] == {"success": True} and len(lines) == 1201